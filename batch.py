@@ -0,0 +1,122 @@
+import os
+import os.path
+import sys
+import traceback
+import multiprocessing
+from contextlib import redirect_stdout
+
+import settings
+from gedcomwriter import GedcomWriter
+from instrumentation import recorder, profiler
+from progress import progress
+
+# Static game data shared with the worker processes.  It is set before the
+# pool is created, so forked workers inherit it instead of rebuilding it.
+shared_game_data = None
+
+def find_saves(paths):
+    saves = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            saves += sorted(os.path.join(path, f) for f in os.listdir(path)
+                            if f.endswith('.ck2'))
+        else:
+            saves.append(path)
+
+    return saves
+
+def output_path(save, output_dir, extension='.ged'):
+    if save.endswith('.ck2'):
+        save = save[:-4]
+
+    if output_dir is None:
+        return save + extension
+    else:
+        return os.path.join(output_dir, os.path.basename(save) + extension)
+
+def convert_save(static_game_data, save, output, mode, render_jobs=1,
+                 fingerprint_file=None):
+    game_data = static_game_data.copy_for_save()
+    game_data.read_save(save, settings.generate_titles)
+
+    if not game_data.mark_characters(settings.real_fathers, mode):
+        raise ValueError('saved in observer mode')
+
+    gedcom_writer = GedcomWriter()
+    gedcom_writer.initialize(game_data)
+    gedcom_writer.write_gedcom(output, render_jobs, fingerprint_file)
+
+def run_task(task):
+    save, output, mode, in_worker = task
+
+    # Worker processes send what they recorded back with the result, and
+    # dump their own profiles, since their copies are lost when they exit
+    if in_worker:
+        recorder.reset()
+        profiler.reset()
+        progress.set_callback(None)
+
+    try:
+        if in_worker:
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                convert_save(shared_game_data, save, output, mode)
+        else:
+            convert_save(shared_game_data, save, output, mode)
+    except Exception as e:
+        # A bad save is recorded and the rest of the batch carries on, with
+        # the traceback in debug mode
+        if settings.debug:
+            traceback.print_exc()
+        error = repr(e)
+    else:
+        error = None
+
+    if in_worker:
+        if profiler.enabled:
+            profiler.dump(os.path.join(profiler.directory,
+                                       os.path.basename(save)[:-4]))
+        return (save, output, error, recorder.phases, recorder.counts,
+                recorder.maximums)
+    return save, output, error, [], {}, {}
+
+def convert_batch(game_data, saves, mode, output_dir=None, jobs=None,
+                  extension='.ged'):
+    global shared_game_data
+    shared_game_data = game_data
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(saves))
+
+    # Without fork, workers would have to rebuild or unpickle the game data,
+    # which is what batches are meant to avoid, so convert one at a time
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        jobs = 1
+
+    tasks = [(s, output_path(s, output_dir, extension), mode, jobs > 1)
+             for s in saves]
+    failures = []
+
+    if jobs > 1:
+        pool = multiprocessing.get_context('fork').Pool(jobs)
+        results = pool.imap_unordered(run_task, tasks)
+    else:
+        pool = None
+        results = map(run_task, tasks)
+
+    try:
+        for save, output, error, phases, counts, maximums in results:
+            recorder.merge(phases, counts, maximums)
+            if error is None:
+                print('### Converted', save, 'to', output, '###')
+            else:
+                print('### Error converting', save + ':', error, '###')
+                failures.append(save)
+            sys.stdout.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return failures
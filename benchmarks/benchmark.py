@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+
+"""End-to-end benchmarks on synthetic game data.
+
+Generates game data and a save at each requested scale, then times loading
+the game data, reading the save, marking characters in each mode, writing
+the GEDCOM file, and searching in the title history browser.
+"""
+
+import argparse
+import json
+import os
+import os.path
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settings
+from gamedata import GameData
+from gedcomwriter import GedcomWriter
+from titlehistorybrowser import TitleHistoryBrowser
+from synthetic import SyntheticGame
+
+search_queries = [['harald'], ['har*'], ['harld~'], ['dyn1'], ['sigurd', 'dyn*'],
+                  ['k_t1'], ['zoe', 'e_*']]
+
+class Benchmark(object):
+    def __init__(self, trace_memory=False, repeat=1):
+        self.trace_memory = trace_memory
+        self.repeat = repeat
+        self.results = []
+
+    def measure(self, scale, stage, function, items=0, unit=''):
+        # The best of several runs is reported, since it is the least
+        # affected by whatever else the machine is doing
+        best = None
+        peak = None
+
+        for i in range(self.repeat):
+            if self.trace_memory:
+                tracemalloc.start()
+
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                start = time.perf_counter()
+                value = function()
+                elapsed = time.perf_counter() - start
+
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            if best is None or elapsed < best:
+                best = elapsed
+
+        result = OrderedDict()
+        result['scale'] = scale
+        result['stage'] = stage
+        result['seconds'] = best
+        result['items'] = items
+        result['unit'] = unit
+        result['throughput'] = items / best if items and best > 0 else None
+        result['peak_memory'] = peak
+        self.results.append(result)
+        self.print_result(result)
+
+        return value
+
+    @staticmethod
+    def print_result(result):
+        line = '{:>9} {:<22} {:>10.3f} s'.format(result['scale'],
+                                                  result['stage'],
+                                                  result['seconds'])
+        if result['throughput'] is not None:
+            line += '  {:>12.1f} {}/s'.format(result['throughput'],
+                                              result['unit'])
+        if result['peak_memory'] is not None:
+            line += '  {:>8.1f} MB peak'.format(result['peak_memory'] / 2**20)
+        print(line)
+        sys.stdout.flush()
+
+    def run_scale(self, directory, characters, mods):
+        game = SyntheticGame(characters=characters,
+                             dynasties=max(10, characters // 20),
+                             titles=max(50, characters // 10),
+                             history_events=10, mods=mods)
+        install_dir, mod_dir, mod_names, save = game.write(directory)
+        save_size = os.path.getsize(save)
+
+        # GameData can only be initialized once, so every repeat needs its
+        # own
+        def initialize():
+            game_data = GameData()
+            game_data.initialize(install_dir, mod_dir, mod_names)
+            return game_data
+
+        static_game_data = self.measure(characters, 'initialize', initialize)
+
+        def read():
+            game_data = static_game_data.copy_for_save()
+            game_data.read_save(save, True)
+            return game_data
+
+        game_data = self.measure(characters, 'read_save', read,
+                                 save_size / 2**20, 'MB')
+
+        for mode in range(1, 6):
+            # Marking and writing change the characters, so every mode starts
+            # from a freshly read save
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                marked_data = read()
+
+            self.measure(characters, 'mark_mode_' + str(mode),
+                         lambda: marked_data.mark_characters(
+                             settings.real_fathers, mode
+                         ), characters, 'characters')
+
+            marked = len([c for c in marked_data.character_map.values()
+                          if c.mark])
+            output = os.path.join(directory, 'mode' + str(mode) + '.ged')
+
+            def write_gedcom():
+                # Generating families adds to the characters' family links,
+                # so every repeat starts from none
+                for character in marked_data.character_map.values():
+                    character.FAMS = []
+                    character.FAMC = ''
+                    character.GEDCOM_id = ''
+
+                gedcom_writer = GedcomWriter()
+                gedcom_writer.initialize(marked_data)
+                gedcom_writer.write_gedcom(output)
+
+            self.measure(characters, 'gedcom_mode_' + str(mode),
+                         write_gedcom, marked, 'characters')
+
+        browser = self.measure(characters, 'browser_index',
+                               lambda: TitleHistoryBrowser(game_data),
+                               characters, 'characters')
+
+        def search():
+            for tokens in search_queries:
+                browser.search(tokens)
+
+        self.measure(characters, 'browser_search', search,
+                     len(search_queries), 'queries')
+
+        title_index = game_data.title_index
+        dates = [game.end_year - 50 * i for i in range(1, 8)]
+
+        def snapshots():
+            for year in dates:
+                title_index.holders_at(GameData.parse_date(str(year) + '.1.1'))
+            for title in game.titles:
+                title_index.succession(title)
+
+        self.measure(characters, 'title_index_queries', snapshots,
+                     len(dates) + len(game.titles), 'queries')
+
+    def report(self):
+        report = OrderedDict()
+        report['python'] = platform.python_version()
+        report['platform'] = platform.platform()
+        report['trace_memory'] = self.trace_memory
+        report['repeat'] = self.repeat
+        report['results'] = self.results
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Runs end-to-end benchmarks on synthetic saves.'
+    )
+    parser.add_argument('--scales', default='1000,10000,100000',
+                        help='comma separated numbers of characters'
+                             ' (default: %(default)s)')
+    parser.add_argument('--mods', type=int, default=2,
+                        help='number of synthetic mods to load'
+                             ' (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='run each stage this many times and report the'
+                             ' fastest (default: %(default)s)')
+    parser.add_argument('--memory', action='store_true',
+                        help='trace peak memory of each stage (makes the'
+                             ' timings slower)')
+    parser.add_argument('--json', metavar='FILE',
+                        help='also write the results to FILE as JSON')
+    parser.add_argument('--keep', metavar='DIR',
+                        help='generate the data in DIR and keep it instead'
+                             ' of using a temporary directory')
+    args = parser.parse_args()
+
+    settings.debug = False
+    settings.generate_titles = True
+
+    benchmark = Benchmark(args.memory, args.repeat)
+    scales = [int(s) for s in args.scales.split(',')]
+
+    for scale in scales:
+        if args.keep is not None:
+            directory = os.path.join(args.keep, str(scale))
+            os.makedirs(directory, exist_ok=True)
+        else:
+            directory = tempfile.mkdtemp(prefix='ck2ged_bench_')
+
+        try:
+            benchmark.run_scale(directory, scale, args.mods)
+        finally:
+            if args.keep is None:
+                shutil.rmtree(directory)
+
+    if args.json is not None:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(benchmark.report(), file, indent=2)
+            file.write('\n')
+
+if __name__ == '__main__':
+    main()
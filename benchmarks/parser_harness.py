@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+
+"""Conformance checks and micro-benchmarks for CK2 parser engines.
+
+Every engine must produce exactly the same stream of (keys, value) pairs as
+GameData.parse_ck2_data.  The harness checks each engine against a corpus of
+tricky snippets with known output, and against the reference engine on
+generated or real files, then reports MB/s and tokens/s for each engine.
+"""
+
+import argparse
+import importlib
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settings
+from gamedata import GameData
+from synthetic import SyntheticGame
+
+# An engine is called as engine(data, is_save, empty_values) and returns an
+# iterable of (keys, value) pairs like GameData.parse_ck2_data
+engines = OrderedDict()
+
+def register_engine(name, engine):
+    engines[name] = engine
+
+def reference_engine(data, is_save, empty_values):
+    return GameData.parse_ck2_data(data, is_save, empty_values)
+
+register_engine('reference', reference_engine)
+
+# name, data, is_save, empty_values, expected stream
+corpus = [
+    ('assignments', 'a = b\nc=d\te = "quoted value"\n', False, False,
+     [(('a',), 'b'), (('c',), 'd'), (('e',), 'quoted value')]),
+    ('nested', 'a = { b = c d = { e = f } }\ng = h\n', False, False,
+     [(('a', 'b'), 'c'), (('a', 'd', 'e'), 'f'), (('g',), 'h')]),
+    ('no_whitespace', 'a={b=c}d={e={f=g}}', False, False,
+     [(('a', 'b'), 'c'), (('d', 'e', 'f'), 'g')]),
+    ('societies', 'societies={2}\nx=y\n', False, False,
+     [(('societies',), ['2']), (('x',), 'y')]),
+    ('bare_list', 'tr={ 1 5 9 }\ncolor = { 0.5 0.2 0.1 }\n', False, False,
+     [(('tr',), ['1', '5', '9']), (('color',), ['0.5', '0.2', '0.1'])]),
+    # The first item of a list is read as a key, so it keeps its quotes
+    ('quoted_list_items',
+     'names = { "Eirik" Harald_Haraldr "Ulf Olafsson" Olaf }\n', False,
+     False,
+     [(('names',), ['"Eirik"', 'Harald_Haraldr', 'Ulf Olafsson', 'Olaf'])]),
+    ('comments',
+     '# leading comment\na = b # trailing\nc = { d e # inside list\n f }\n'
+     'g = { # after brace\n h = i\n}\n', False, False,
+     [(('a',), 'b'), (('c',), ['d', 'e', 'f']), (('g', 'h'), 'i')]),
+    ('list_turns_into_key', 'a = { b = c }\nd = { e f = g }\n', False, False,
+     [(('a', 'b'), 'c'), (('d',), ['e', 'f', '=', 'g'])]),
+    ('value_then_brace', 'a=b{ c=d }\n', False, False,
+     [(('a',), 'b'), (('', 'c'), 'd')]),
+    ('anonymous_blocks', 'a = { { b = c } { d = e } }\n', False, False,
+     [(('a', '', 'b'), 'c'), (('a', '', 'd'), 'e')]),
+    ('dates_as_keys',
+     'history = { 1066.9.15 = { holder = { who = 5 type = invasion } } }\n',
+     False, False,
+     [(('history', '1066.9.15', 'holder', 'who'), '5'),
+      (('history', '1066.9.15', 'holder', 'type'), 'invasion')]),
+    ('cp1252', 'bn="Zoë"\nname = Þórir\n', False, False,
+     [(('bn',), 'Zoë'), (('name',), 'Þórir')]),
+    ('empty_block', 'a = { }\nb = c\n', False, False,
+     [(('b',), 'c')]),
+    ('empty_values',
+     'k_x = {\n\tcolor = { 1 2 3 }\n\td_y = {\n\t\tc_z = {\n\t\t\tb_w = { }\n'
+     '\t\t}\n\t}\n}\n', False, True,
+     [(('k_x', 'color'), ['1', '2', '3']), (('k_x', 'd_y', 'c_z', 'b_w'), ''),
+      (('k_x', 'd_y', 'c_z'), ''), (('k_x', 'd_y'), ''), (('k_x',), '')]),
+    ('save_header',
+     'CK2txt\nversion="2.8.3.3"\nplayer=\n{\n\tid=1\n\ttype=45\n}\n',
+     True, False,
+     [(('version',), '2.8.3.3'), (('player', 'id'), '1'),
+      (('player', 'type'), '45')]),
+]
+
+def normalize(stream):
+    # The reference engine reuses and mutates its key list between yields,
+    # so keys must be copied as they are produced
+    result = []
+    for keys, value in stream:
+        if isinstance(value, list):
+            value = list(value)
+        result.append((tuple(keys), value))
+    return result
+
+def run_engine(engine, data, is_save, empty_values):
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        return normalize(engine(data, is_save, empty_values))
+
+def first_difference(expected, actual):
+    for i in range(min(len(expected), len(actual))):
+        if expected[i] != actual[i]:
+            return (i, expected[i], actual[i])
+    if len(expected) != len(actual):
+        i = min(len(expected), len(actual))
+        return (i, expected[i] if i < len(expected) else None,
+                actual[i] if i < len(actual) else None)
+    return None
+
+def check_corpus(names):
+    failures = 0
+
+    for name, data, is_save, empty_values, expected in corpus:
+        for engine_name in names:
+            actual = run_engine(engines[engine_name], data, is_save,
+                                empty_values)
+            difference = first_difference(expected, actual)
+            if difference is not None:
+                failures += 1
+                print('FAIL', engine_name, name + ': token', difference[0],
+                      'expected', repr(difference[1]), 'got',
+                      repr(difference[2]))
+
+    print(len(corpus), 'snippets,', failures, 'failures')
+    return failures
+
+def generated_files(directory, characters):
+    game = SyntheticGame(characters=characters,
+                         dynasties=max(10, characters // 20),
+                         titles=max(50, characters // 10), mods=0)
+    install_dir, mod_dir, mods, save = game.write(directory)
+    common = os.path.join(install_dir, 'common')
+
+    files = [(save, True, False)]
+    for d in sorted(os.listdir(common)):
+        for f in sorted(os.listdir(os.path.join(common, d))):
+            files.append((os.path.join(common, d, f), False,
+                          d == 'landed_titles'))
+    return files
+
+def benchmark_files(names, files, repeat):
+    failures = 0
+
+    for filename, is_save, empty_values in files:
+        with open(filename, encoding='cp1252', errors='replace') as file:
+            data = file.read()
+        size = len(data) / 2**20
+        reference = None
+
+        print(os.path.basename(filename),
+              '({:.2f} MB)'.format(size))
+
+        for engine_name in names:
+            best = None
+            for i in range(repeat):
+                start = time.perf_counter()
+                stream = run_engine(engines[engine_name], data, is_save,
+                                    empty_values)
+                elapsed = time.perf_counter() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+
+            if reference is None:
+                reference = stream
+                status = ''
+            else:
+                difference = first_difference(reference, stream)
+                if difference is None:
+                    status = 'ok'
+                else:
+                    failures += 1
+                    status = ('MISMATCH at token ' + str(difference[0]) +
+                              ': expected ' + repr(difference[1]) +
+                              ', got ' + repr(difference[2]))
+
+            print('  {:<16} {:>8.3f} s {:>8.2f} MB/s {:>12.0f} tokens/s  {}'
+                  .format(engine_name, best, size / best if best else 0,
+                          len(stream) / best if best else 0, status))
+            sys.stdout.flush()
+
+    return failures
+
+def load_engine(spec):
+    # name=module:function
+    name, target = spec.split('=', 1)
+    module_name, function_name = target.split(':', 1)
+    module = importlib.import_module(module_name)
+    register_engine(name, getattr(module, function_name))
+    return name
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Checks parser engines against the reference parser and'
+                    ' measures their speed.'
+    )
+    parser.add_argument('files', nargs='*',
+                        help='game files or saves to parse as well; files'
+                             ' ending in .ck2 are parsed as saves')
+    parser.add_argument('--engine', action='append', default=[],
+                        metavar='NAME=MODULE:FUNCTION',
+                        help='add an engine to compare; may be repeated')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='only run these engines (the first is used as'
+                             ' the reference for files)')
+    parser.add_argument('--characters', type=int, default=5000,
+                        help='size of the generated save; 0 to skip'
+                             ' generated files (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='report the fastest of this many runs'
+                             ' (default: %(default)s)')
+    parser.add_argument('--landed-titles', action='store_true',
+                        help='parse the given files with empty_values, as'
+                             ' for landed titles')
+    args = parser.parse_args()
+
+    settings.debug = False
+
+    for spec in args.engine:
+        load_engine(spec)
+
+    names = args.only if args.only is not None else list(engines)
+    for name in names:
+        if name not in engines:
+            parser.error('unknown engine: ' + name)
+
+    failures = check_corpus(names)
+
+    files = [(f, f.endswith('.ck2'), args.landed_titles) for f in args.files]
+    directory = None
+    if args.characters > 0:
+        directory = tempfile.mkdtemp(prefix='ck2ged_parser_')
+        files += generated_files(directory, args.characters)
+
+    try:
+        failures += benchmark_files(names, files, args.repeat)
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory)
+
+    sys.exit(1 if failures > 0 else 0)
+
+if __name__ == '__main__':
+    main()
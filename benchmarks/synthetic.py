@@ -0,0 +1,466 @@
+#!/usr/bin/python3
+
+"""Generates synthetic CK2 game data and saves for benchmarking.
+
+The generated install directory, mod directory and save are syntactically
+valid for GameData, but contain made-up characters, dynasties and titles, so
+performance can be measured without a real save or a CK2 install.
+"""
+
+import argparse
+import os
+import os.path
+import random
+import zipfile
+from bisect import bisect_left, bisect_right
+
+first_names = ['Harald', 'Olaf', 'Eirik', 'Sigurd', 'Basil', 'Konstantinos',
+               'Robert', 'William', 'Henri', 'Guillaume', 'Æthelred', 'Þórir',
+               'Álfr', 'Ragnvald', 'Leo', 'Romanos']
+female_names = ['Ingrid', 'Astrid', 'Zoë', 'Theodora', 'Matilda', 'Emma',
+                'Sigrid', 'Hélène', 'Anna', 'Eudokia', 'Gunnhild', 'Ragnhild']
+succession_types = ['inheritance', 'invasion', 'claim', 'election', 'grant',
+                    'revoke', 'usurp', 'holy_war', 'faction_demand', 'created']
+ranks = ['e', 'k', 'd', 'c', 'b']
+rank_names = ['emperor', 'king', 'duke', 'count', 'baron']
+realm_names = ['empire', 'kingdom', 'duchy', 'county', 'barony']
+
+class SyntheticGame(object):
+    def __init__(self, characters=1000, dynasties=100, titles=200,
+                 history_events=10, mods=0, seed=0, start_year=769,
+                 end_year=1200):
+        self.random = random.Random(seed)
+        self.num_characters = characters
+        self.num_dynasties = dynasties
+        self.num_titles = titles
+        self.history_events = history_events
+        self.num_mods = mods
+        self.start_year = start_year
+        self.end_year = end_year
+        self.cultures = ['norse', 'greek', 'frankish', 'english']
+        self.religions = ['catholic', 'orthodox', 'norse_pagan']
+
+        self.generate_titles()
+        self.generate_characters()
+        self.generate_title_histories()
+
+    def generate_titles(self):
+        # Breadth-first tree of titles, four vassals per liege
+        self.titles = []
+        self.title_parent = {}
+        queue = []
+        count = 0
+
+        while count < self.num_titles:
+            if len(queue) == 0 or len(self.titles) < 1:
+                title = 'e_t' + str(count)
+                self.titles.append(title)
+                queue.append(title)
+                count += 1
+                continue
+
+            liege = queue.pop(0)
+            rank = ranks.index(liege[0])
+            if rank == len(ranks) - 1:
+                continue
+
+            for i in range(4):
+                if count >= self.num_titles:
+                    break
+                title = ranks[rank + 1] + '_t' + str(count)
+                self.titles.append(title)
+                self.title_parent[title] = liege
+                queue.append(title)
+                count += 1
+
+    def generate_characters(self):
+        rnd = self.random
+        span = self.end_year - self.start_year - 16
+        self.birth_year = []
+        self.death_year = []
+        self.gender = []
+        self.father = []
+        self.mother = []
+        self.real_father = []
+        self.dynasty = []
+        self.spouses = []
+        self.culture = []
+        self.names = []
+
+        males = []
+        male_years = []
+        females = []
+        female_years = []
+
+        for i in range(self.num_characters):
+            year = self.start_year + (span * i) // self.num_characters
+            female = rnd.random() < 0.5
+            father = -1
+            mother = -1
+            real_father = -1
+            dynasty = rnd.randrange(self.num_dynasties)
+
+            lo = bisect_left(male_years, year - 50)
+            hi = bisect_right(male_years, year - 18)
+            if hi > lo and rnd.random() < 0.9:
+                father = males[rnd.randrange(lo, hi)]
+                dynasty = self.dynasty[father]
+
+                if len(self.spouses[father]) > 0:
+                    mother = self.spouses[father][-1]
+                else:
+                    lo = bisect_left(female_years, year - 45)
+                    hi = bisect_right(female_years, year - 16)
+                    if hi > lo:
+                        mother = females[rnd.randrange(lo, hi)]
+                        self.spouses[father].append(mother)
+                        self.spouses[mother].append(father)
+
+                if rnd.random() < 0.03 and hi > lo:
+                    real_father = males[rnd.randrange(
+                        bisect_left(male_years, year - 50),
+                        bisect_right(male_years, year - 18)
+                    )]
+
+            self.birth_year.append(year)
+            if year + 70 < self.end_year:
+                self.death_year.append(year + rnd.randint(20, 70))
+            else:
+                self.death_year.append(None)
+            self.gender.append(0 if female else 1)
+            self.father.append(father)
+            self.mother.append(mother)
+            self.real_father.append(real_father)
+            self.dynasty.append(dynasty)
+            self.spouses.append([])
+            self.culture.append(self.cultures[dynasty % len(self.cultures)])
+            self.names.append(rnd.choice(female_names if female
+                                         else first_names))
+
+            if female:
+                females.append(i)
+                female_years.append(year)
+            else:
+                males.append(i)
+                male_years.append(year)
+
+        # The player is the most recently born living male with a father
+        self.player = 0
+        for i in range(self.num_characters - 1, -1, -1):
+            if self.gender[i] == 1 and self.father[i] >= 0:
+                self.player = i
+                break
+
+    def character_id(self, index):
+        return index + 1
+
+    def generate_title_histories(self):
+        rnd = self.random
+        self.histories = {}
+        self.primary = {}
+        adults = [i for i in range(self.num_characters)
+                  if self.birth_year[i] + 16 < self.end_year]
+
+        for title in self.titles:
+            events = []
+            year = self.start_year + rnd.randint(16, 40)
+            step = max(1, (self.end_year - year) // (self.history_events + 1))
+
+            for e in range(self.history_events):
+                year += rnd.randint(1, step)
+                if year >= self.end_year:
+                    break
+                lo = bisect_left(self.birth_year, year - 60)
+                hi = bisect_right(self.birth_year, year - 16)
+                if hi <= lo:
+                    continue
+                holder = rnd.randrange(lo, hi)
+                date = (year, rnd.randint(1, 12), rnd.randint(1, 28))
+                events.append((date, holder, rnd.choice(succession_types)))
+
+            self.histories[title] = events
+
+            if len(events) > 0 and len(adults) > 0:
+                holder = events[-1][1]
+                if (holder not in self.primary or
+                    ranks.index(title[0]) <
+                    ranks.index(self.primary[holder][0])):
+                    self.primary[holder] = title
+
+    def write_install(self, install_dir):
+        common = os.path.join(install_dir, 'common')
+        for d in ['dynasties', 'landed_titles', 'cultures', 'religions',
+                  'governments']:
+            os.makedirs(os.path.join(common, d), exist_ok=True)
+        os.makedirs(os.path.join(install_dir, 'localisation'), exist_ok=True)
+
+        with open(os.path.join(common, 'dynasties', '00_dynasties.txt'), 'w',
+                  encoding='cp1252') as file:
+            file.write(self.dynasties_text(0, self.num_dynasties))
+
+        with open(os.path.join(common, 'cultures', '00_cultures.txt'), 'w',
+                  encoding='cp1252') as file:
+            file.write('# Synthetic cultures\n')
+            file.write('north_germanic = {\n')
+            for culture in self.cultures:
+                file.write('\t' + culture + ' = {\n')
+                file.write('\t\tmale_names = { ' +
+                           ' '.join(n + '_' + n.upper() for n in first_names)
+                           + ' "Ulf" }\n')
+                file.write('\t\tfemale_names = { ' + ' '.join(female_names)
+                           + ' }\n')
+                if culture == 'greek':
+                    file.write('\t\tdynasty_name_first = yes\n')
+                if culture == 'norse':
+                    file.write('\t\tdukes_called_kings = yes\n')
+                file.write('\t\tcolor = { 0.5 0.2 0.1 }\n')
+                file.write('\t}\n')
+            file.write('}\n')
+
+        with open(os.path.join(common, 'religions', '00_religions.txt'), 'w',
+                  encoding='cp1252') as file:
+            file.write('christian = {\n')
+            for religion in self.religions:
+                file.write('\t' + religion + ' = {\n')
+                file.write('\t\tpriest_title = PRIEST_' + religion.upper()
+                           + '\n')
+                file.write('\t\tcolor = { 0.8 0.8 0.8 }\n')
+                file.write('\t}\n')
+            file.write('}\n')
+
+        with open(os.path.join(common, 'governments', '00_governments.txt'),
+                  'w', encoding='cp1252') as file:
+            file.write('feudal_governments = {\n')
+            file.write('\tfeudal_government = {\n')
+            file.write('\t\ttitle_prefix = "feudal_"\n')
+            file.write('\t}\n')
+            file.write('\tnomadic_government = {\n')
+            file.write('\t\ttitle_prefix = "nomadic_"\n')
+            file.write('\t}\n')
+            file.write('}\n')
+
+        with open(os.path.join(common, 'landed_titles', '00_titles.txt'), 'w',
+                  encoding='cp1252') as file:
+            file.write(self.landed_titles_text())
+
+        with open(os.path.join(install_dir, 'localisation', '00_titles.csv'),
+                  'w', encoding='cp1252') as file:
+            file.write('#CODE;ENGLISH;FRENCH;GERMAN;;SPANISH;;;;;;;;;x\n')
+            for title in self.titles:
+                file.write(title + ';' + title[2:].title() + ';;;;;;;;;;;;;x\n')
+            for rank, realm in zip(rank_names, realm_names):
+                file.write(rank + ';' + rank.title() + ';;;;;;;;;;;;;x\n')
+                file.write(rank + '_female;' + rank.title() + 'ess;;;;;;;;;;;'
+                           ';;x\n')
+                file.write(realm + '_of;' + realm.title() + ' of;;;;;;;;;;;'
+                           ';;x\n')
+            for religion in self.religions:
+                file.write('PRIEST_' + religion.upper() + ';Priest;;;;;;;;;;;'
+                           ';;x\n')
+
+    def dynasties_text(self, first, last):
+        lines = []
+        for d in range(first, last):
+            culture = self.cultures[d % len(self.cultures)]
+            lines.append(str(d + 1) + ' = {')
+            lines.append('\tname = "Dyn' + str(d) + '"')
+            lines.append('\tculture = ' + culture)
+            lines.append('\tcoat_of_arms = {')
+            lines.append('\t\tdata = { 0 0 0 1 2 }')
+            lines.append('\t\treligion = "'
+                         + self.religions[d % len(self.religions)] + '"')
+            lines.append('\t}')
+            lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    def landed_titles_text(self):
+        children = {}
+        for title in self.titles:
+            if title in self.title_parent:
+                children.setdefault(self.title_parent[title], []).append(title)
+
+        lines = []
+
+        def write(title, depth):
+            indent = '\t' * depth
+            lines.append(indent + title + ' = {')
+            lines.append(indent + '\tcolor = { 100 120 140 }')
+            if title.startswith('k_'):
+                lines.append(indent + '\tgreek = "Basileia ' + title[2:] + '"')
+            if title.startswith('d_') and title.endswith('7'):
+                lines.append(indent + '\ttitle = "GRAND_DUKE"')
+                lines.append(indent + '\ttitle_female = "GRAND_DUCHESS"')
+            for child in children.get(title, []):
+                if child.startswith('b_'):
+                    lines.append(indent + '\t' + child + ' = { }')
+                else:
+                    write(child, depth + 1)
+            lines.append(indent + '}')
+
+        for title in self.titles:
+            if title not in self.title_parent:
+                write(title, 0)
+
+        return '\n'.join(lines) + '\n'
+
+    def write_mods(self, mod_dir):
+        os.makedirs(mod_dir, exist_ok=True)
+        names = []
+
+        for m in range(self.num_mods):
+            name = 'synthetic_mod_' + str(m)
+            dynasties = self.dynasties_text(self.num_dynasties + m * 10,
+                                            self.num_dynasties + m * 10 + 10)
+            localisation = ''.join(t + ';Mod ' + t[2:].title() + ';;;;;;;;;;;'
+                                   ';;x\n' for t in self.titles[m::7])
+
+            if m % 2 == 0:
+                path = os.path.join(mod_dir, name)
+                os.makedirs(os.path.join(path, 'common', 'dynasties'),
+                            exist_ok=True)
+                os.makedirs(os.path.join(path, 'localisation'),
+                            exist_ok=True)
+                with open(os.path.join(path, 'common', 'dynasties',
+                                       name + '.txt'), 'w',
+                          encoding='cp1252') as file:
+                    file.write(dynasties)
+                with open(os.path.join(path, 'localisation', name + '.csv'),
+                          'w', encoding='cp1252') as file:
+                    file.write(localisation)
+            else:
+                name += '.zip'
+                with zipfile.ZipFile(os.path.join(mod_dir, name), 'w') as z:
+                    z.writestr('common/dynasties/' + name[:-4] + '.txt',
+                               dynasties.encode('cp1252'))
+                    z.writestr('localisation/' + name[:-4] + '.csv',
+                               localisation.encode('cp1252'))
+            names.append(name)
+
+        return names
+
+    def write_save(self, filename):
+        with open(filename, 'w', encoding='cp1252') as file:
+            file.write('CK2txt\n')
+            file.write('version="2.8.3.3"\n')
+            file.write('date="' + str(self.end_year) + '.1.1"\n')
+            file.write('player=\n{\n\tid=' +
+                       str(self.character_id(self.player)) +
+                       '\n\ttype=45\n}\n')
+            file.write('dynasties=\n{\n')
+            for d in range(self.num_dynasties):
+                file.write('\t' + str(d + 1) + '=\n\t{\n')
+                file.write('\t\tname="Dyn' + str(d) + '"\n')
+                file.write('\t\tculture="' +
+                           self.cultures[d % len(self.cultures)] + '"\n')
+                file.write('\t}\n')
+            file.write('}\n')
+
+            file.write('character=\n{\n')
+            for i in range(self.num_characters):
+                file.write(self.character_text(i))
+            file.write('}\n')
+
+            file.write('delayed_event=\n{\n\tevent=\n\t{\n\t\tid=1234\n'
+                       '\t\tdays=10\n\t}\n}\n')
+
+            file.write('title=\n{\n')
+            for title in self.titles:
+                file.write(self.title_text(title))
+            file.write('}\n')
+
+    def character_text(self, i):
+        lines = ['\t' + str(self.character_id(i)) + '=', '\t{']
+        lines.append('\t\tbn="' + self.names[i] + '"')
+        if i % 11 == 0:
+            lines.append('\t\tname="' + self.names[i] + '"')
+        lines.append('\t\tb_d="' + str(self.birth_year[i]) + '.' +
+                     str(i % 12 + 1) + '.' + str(i % 28 + 1) + '"')
+        if self.death_year[i] is not None:
+            lines.append('\t\td_d="' + str(self.death_year[i]) + '.3.4"')
+        if self.gender[i] == 0:
+            lines.append('\t\tfem=yes')
+        if self.father[i] >= 0:
+            lines.append('\t\tfat=' + str(self.character_id(self.father[i])))
+        if self.real_father[i] >= 0:
+            lines.append('\t\trfat=' +
+                         str(self.character_id(self.real_father[i])))
+        if self.mother[i] >= 0:
+            lines.append('\t\tmot=' + str(self.character_id(self.mother[i])))
+        for s in self.spouses[i]:
+            lines.append('\t\tspouse=' + str(self.character_id(s)))
+        lines.append('\t\tdnt=' + str(self.dynasty[i] + 1))
+        lines.append('\t\tcul="' + self.culture[i] + '"')
+        lines.append('\t\trel="' + self.religions[i % len(self.religions)]
+                     + '"')
+        if i % 13 == 0:
+            lines.append('\t\tnick=\n\t\t{\n\t\t\tnickname="nick_the_great"'
+                         '\n\t\t}')
+        lines.append('\t\ttr={ 1 5 9 }')
+        lines.append('\t\tsocieties={2}')
+        if i in self.primary:
+            lines.append('\t\tgov="feudal_government"')
+            lines.append('\t\toh="' + self.primary[i] + '"')
+            lines.append('\t\tdmn=\n\t\t{\n\t\t\tprimary=\n\t\t\t{\n'
+                         '\t\t\t\ttitle="' + self.primary[i] + '"\n'
+                         '\t\t\t}\n\t\t}')
+        lines.append('\t}')
+        return '\n'.join(lines) + '\n'
+
+    def title_text(self, title):
+        lines = ['\t' + title + '=', '\t{']
+        events = self.histories[title]
+        if len(events) > 0:
+            lines.append('\t\tholder=' + str(self.character_id(events[-1][1])))
+        if title in self.title_parent:
+            lines.append('\t\tliege="' + self.title_parent[title] + '"')
+        lines.append('\t\thistory=\n\t\t{')
+        for date, holder, succession_type in events:
+            lines.append('\t\t\t' + '.'.join(map(str, date)) + '=')
+            lines.append('\t\t\t{')
+            lines.append('\t\t\t\tholder=')
+            lines.append('\t\t\t\t{')
+            lines.append('\t\t\t\t\twho=' + str(self.character_id(holder)))
+            lines.append('\t\t\t\t\ttype=' + succession_type)
+            lines.append('\t\t\t\t}')
+            lines.append('\t\t\t}')
+        lines.append('\t\t}')
+        lines.append('\t}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory, save_name='synthetic'):
+        install_dir = os.path.join(directory, 'install')
+        mod_dir = os.path.join(directory, 'mod')
+        save = os.path.join(directory, save_name + '.ck2')
+
+        self.write_install(install_dir)
+        mods = self.write_mods(mod_dir)
+        self.write_save(save)
+
+        return install_dir, mod_dir, mods, save
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generates a synthetic CK2 install directory, mod'
+                    ' directory and save for benchmarking.'
+    )
+    parser.add_argument('directory', help='directory to write to')
+    parser.add_argument('--characters', type=int, default=1000)
+    parser.add_argument('--dynasties', type=int, default=100)
+    parser.add_argument('--titles', type=int, default=200)
+    parser.add_argument('--history-events', type=int, default=10,
+                        help='holder changes per title')
+    parser.add_argument('--mods', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    game = SyntheticGame(args.characters, args.dynasties, args.titles,
+                         args.history_events, args.mods, args.seed)
+    install_dir, mod_dir, mods, save = game.write(args.directory)
+
+    print('Install directory:', install_dir)
+    print('Mod directory:', mod_dir)
+    print('Mods:', ' '.join(mods))
+    print('Save:', save)
+
+if __name__ == '__main__':
+    main()
@@ -2,17 +2,101 @@
 
 import sys
 import os.path
+from contextlib import redirect_stdout
 
 import settings
-from gamedata import prepare_game_data
-from gedcomwriter import GedcomWriter
+from commandline import *
+from gamedata import *
+from gedcomwriter import GedcomWriter, STDOUT
+from sqlitewriter import SqliteWriter
+from csvwriter import CsvWriter
+from batch import find_saves, convert_batch
+from watch import watch_directory
+
+def gedcom_extension(args):
+    if args.compress is None:
+        return '.ged'
+    else:
+        return '.ged.' + args.compress
+
+def run_batch(args, interactive):
+    saves = find_saves(args.batch)
+    if len(saves) == 0:
+        print('No save files found.')
+        exit_with_error(interactive)
+
+    game_data = initialize_game_data(args.mods, interactive)
+
+    mode = args.mode
+    if mode is None:
+        mode = GameData.prompt_for_mode()
+
+    if args.output_dir is not None and not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    failures = convert_batch(game_data, saves, mode, args.output_dir,
+                             args.jobs, gedcom_extension(args))
+
+    print('### Converted {0} of {1} saves. ###'.format(
+        len(saves) - len(failures), len(saves)))
+
+    if len(failures) > 0:
+        exit_with_error(interactive)
+
+def run_watch(args, interactive):
+    game_data = initialize_game_data(args.mods, interactive)
+
+    mode = args.mode
+    if mode is None:
+        mode = GameData.prompt_for_mode()
+
+    if args.output_dir is not None and not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    try:
+        watch_directory(game_data, args.watch, mode, args.output_dir,
+                        args.interval, args.settle, args.render_jobs,
+                        gedcom_extension(args), args.incremental)
+    except KeyboardInterrupt:
+        print('\n### Stopped watching. ###')
 
 def main():
-    game_data, filename = prepare_game_data()
+    parser = argument_parser('Converts a Crusader Kings II save file into a'
+                             ' GEDCOM file.')
+    add_gedcom_arguments(parser)
+    args = parse_arguments(parser)
 
-    if not game_data.mark_characters(settings.real_fathers):
-        sys.stdin.readline()
-        sys.exit()
+    # When the GEDCOM data goes to standard output, messages go to standard
+    # error instead
+    if args.output == STDOUT:
+        with redirect_stdout(sys.stderr):
+            run(args)
+    else:
+        run(args)
+
+def run(args):
+    try:
+        convert(args)
+    finally:
+        write_report(args)
+
+def convert(args):
+    interactive = not args.no_input
+
+    if args.batch is not None:
+        run_batch(args, interactive)
+        return
+
+    if args.watch is not None:
+        run_watch(args, interactive)
+        return
+
+    game_data, filename = prepare_game_data(args.save, args.mods, interactive)
+
+    if not game_data.mark_characters(settings.real_fathers, args.mode,
+                                     args.root_characters,
+                                     args.root_dynasties, args.root_titles):
+        exit_with_error(interactive)
 
     gedcom_writer = GedcomWriter()
 
@@ -25,12 +109,19 @@ def main():
             print('Error generating GEDCOM family information.')
             print('Please post to the Paradox Interactive Forums thread,'
 		  ' upload your save and note any mods you are using.')
-            sys.stdout.flush()
-            sys.stdin.readline()
-            sys.exit()
+            exit_with_error(interactive)
+
+    if args.output is None:
+        output = filename + gedcom_extension(args)
+    else:
+        output = args.output
 
     try:
-        gedcom_writer.write_gedcom(filename + '.ged')
+        if args.shard is not None:
+            gedcom_writer.write_shards(output, args.shard, args.render_jobs)
+        else:
+            gedcom_writer.write_gedcom(output, args.render_jobs,
+                                       args.incremental)
     except Exception:
         if settings.debug:
             raise
@@ -38,9 +129,36 @@ def main():
             print('Error writing GEDCOM file.')
             print('Please post to the Paradox Interactive Forums thread,'
 		  ' upload your save and note any mods you are using.')
-            sys.stdout.flush()
-            sys.stdin.readline()
-            sys.exit()
+            exit_with_error(interactive)
+
+    if args.sqlite is not None:
+        sqlite_writer = SqliteWriter()
+        sqlite_writer.initialize(game_data, gedcom_writer.family_map)
+
+        try:
+            sqlite_writer.write_sqlite(args.sqlite)
+        except Exception:
+            if settings.debug:
+                raise
+            else:
+                print('Error writing SQLite database.')
+                exit_with_error(interactive)
+
+    for directory, tabs in [(args.csv, False), (args.tsv, True)]:
+        if directory is None:
+            continue
+
+        csv_writer = CsvWriter(tabs)
+        csv_writer.initialize(game_data, gedcom_writer.family_map)
+
+        try:
+            csv_writer.write_csv(directory)
+        except Exception:
+            if settings.debug:
+                raise
+            else:
+                print('Error writing', csv_writer.extension, 'files.')
+                exit_with_error(interactive)
 
 if __name__ == '__main__':
     main()
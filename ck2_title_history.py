@@ -4,12 +4,26 @@ import sys
 import os.path
 
 import settings
-from gamedata import prepare_game_data
+from commandline import argument_parser, parse_arguments, write_report
+from gamedata import prepare_game_data, exit_with_error
 from titlehistorybrowser import TitleHistoryBrowser
 
 def main():
+    parser = argument_parser('Browses the personal title histories of the'
+                             ' characters in a Crusader Kings II save file.')
+    args = parse_arguments(parser)
+
     settings.generate_titles = True
-    game_data, filename = prepare_game_data()
+
+    try:
+        browse(args)
+    finally:
+        write_report(args)
+
+def browse(args):
+    interactive = not args.no_input
+
+    game_data, filename = prepare_game_data(args.save, args.mods, interactive)
     title_history_browser = TitleHistoryBrowser(game_data)
 
     try:
@@ -22,8 +36,7 @@ def main():
             print('Please post to the Paradox Interactive forums, describing'
                   ' what you were trying to do when the tool crashed, along'
                   ' with a copy of your save.')
-            sys.stdin.readline()
-            sys.exit()
+            exit_with_error(interactive)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,237 @@
+import argparse
+import os.path
+import settings
+import sys
+from instrumentation import recorder, profiler
+from progress import progress, ProgressBar
+
+def argument_parser(description):
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog='Options that are not given fall back to the values in'
+               ' settings.py.'
+    )
+    parser.add_argument('save', nargs='?', default=None,
+                        help='save file to read (.ck2); asked for if omitted')
+    parser.add_argument('--install-dir', dest='ck2_install_dir',
+                        help='CK2 install directory')
+    parser.add_argument('--mod-dir', dest='mod_dir',
+                        help='directory where mods are installed')
+    parser.add_argument('--mods', nargs='*', metavar='MOD', default=None,
+                        help='mods used with the save, as named in the mod'
+                             ' directory; asked for if omitted')
+    parser.add_argument('--no-input', action='store_true',
+                        help='never ask for input or wait for enter; missing'
+                             ' mods mean no mods')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write the time and memory used by each step to'
+                             ' FILE as JSON')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='profile every step and write one .pstats file'
+                             ' per step to DIR')
+    parser.add_argument('--profile-top', type=int, default=20, metavar='N',
+                        help='number of functions to list in the profile'
+                             ' summary (default: 20)')
+    parser.add_argument('--no-progress', action='store_true',
+                        help='do not draw progress bars (they are only drawn'
+                             ' on a terminal anyway)')
+    parser.add_argument('--debug', dest='debug', action='store_true',
+                        default=None, help='re-raise errors instead of'
+                                           ' reporting them')
+    parser.add_argument('--no-debug', dest='debug', action='store_false',
+                        help='report errors instead of re-raising them')
+    return parser
+
+def add_gedcom_arguments(parser):
+    parser.add_argument('--mode', type=int, choices=[1, 2, 3, 4, 5],
+                        help='characters to include: 1) entire tree, 2)'
+                             ' extended dynasty tree, 3) standard dynasty'
+                             ' tree, 4) abbreviated dynasty tree, 5) closest'
+                             ' relatives up to --max-characters; asked for'
+                             ' if omitted')
+    parser.add_argument('-o', '--output',
+                        help='GEDCOM file to write, compressed if it ends in'
+                             ' .gz or .xz, or - for standard output'
+                             ' (default: the save name with .ged)')
+    parser.add_argument('--compress', choices=['gz', 'xz'],
+                        help='compress GEDCOM files that are named after'
+                             ' their saves, adding .gz or .xz to the name')
+    parser.add_argument('--batch', nargs='+', metavar='PATH',
+                        help='convert every given save, and every .ck2 file'
+                             ' in every given directory, reading the game'
+                             ' data only once')
+    parser.add_argument('--jobs', type=int, metavar='N',
+                        help='number of saves to convert at the same time in'
+                             ' batch mode (default: one per CPU)')
+    parser.add_argument('--watch', metavar='DIR',
+                        help='keep running and convert every save that is'
+                             ' written to the directory')
+    parser.add_argument('--interval', type=float, default=5.0,
+                        metavar='SECONDS',
+                        help='how often to look for new saves in watch mode'
+                             ' (default: 5)')
+    parser.add_argument('--settle', type=float, default=10.0,
+                        metavar='SECONDS',
+                        help='how long a save must stay unchanged before it'
+                             ' is converted in watch mode (default: 10)')
+    parser.add_argument('--render-jobs', type=int, default=1, metavar='N',
+                        help='number of processes that write GEDCOM records,'
+                             ' or files with --shard (default: 1)')
+    parser.add_argument('--shard', choices=['dynasty', 'component'],
+                        help='split the GEDCOM file into one file per'
+                             ' dynasty or per connected family tree, named'
+                             ' after the output file, e.g. mygame.tree1.ged')
+    parser.add_argument('--incremental', metavar='FILE',
+                        help='only write records that are new or changed'
+                             ' since the export recorded in FILE, then record'
+                             ' this export in FILE; with --watch, each save'
+                             ' uses FILE with the save name added')
+    parser.add_argument('--sqlite', metavar='FILE',
+                        help='also write all characters, dynasties, families'
+                             ' and title ownerships to the SQLite database'
+                             ' FILE')
+    parser.add_argument('--csv', metavar='DIR',
+                        help='also write the same tables as .csv files to'
+                             ' DIR')
+    parser.add_argument('--tsv', metavar='DIR',
+                        help='also write the same tables as tab separated'
+                             ' .tsv files to DIR')
+    parser.add_argument('--output-dir', metavar='DIR',
+                        help='directory for the GEDCOM files written in batch'
+                             ' or watch mode (default: next to each save)')
+    parser.add_argument('--root-characters', type=int, nargs='+',
+                        metavar='ID',
+                        help='start modes 2 to 5 from these characters (by'
+                             ' game id) instead of your dynasty')
+    parser.add_argument('--root-dynasties', type=int, nargs='+',
+                        metavar='ID',
+                        help='start modes 2 to 5 from the members of these'
+                             ' dynasties instead of your dynasty')
+    parser.add_argument('--root-titles', nargs='+', metavar='TITLE',
+                        help='start modes 2 to 5 from everyone who held one'
+                             ' of these titles, e.g. e_byzantium, instead of'
+                             ' your dynasty')
+    parser.add_argument('--ancestors', type=int, metavar='N',
+                        dest='ancestor_generations',
+                        help='generations of ancestors of your dynasty'
+                             ' members to include in modes 2 to 4, -1 for'
+                             ' all (default: 1)')
+    parser.add_argument('--descendants', type=int, metavar='N',
+                        dest='descendant_generations',
+                        help='generations of descendants of your dynasty'
+                             ' members to include in modes 2 to 4, -1 for'
+                             ' all (default: all, 1 or 0 depending on the'
+                             ' mode)')
+    parser.add_argument('--max-characters', type=int, metavar='N',
+                        dest='max_characters',
+                        help='number of characters to include in mode 5'
+                             ' (default: 10000)')
+    add_switch(parser, 'spouses', 'include_spouses',
+               'include the spouses of your dynasty members and their'
+               ' descendants')
+    add_switch(parser, 'cull-loners', 'cull_loners',
+               'remove characters with no family')
+    add_switch(parser, 'cull-childless-spouses', 'cull_childless_spouses',
+               'remove otherwise unrelated spouses that produced no children')
+    add_switch(parser, 'real-fathers', 'real_fathers',
+               'use real fathers instead of presumed fathers')
+    add_switch(parser, 'titles', 'generate_titles',
+               'write primary titles and years of rule')
+
+def add_switch(parser, name, dest, help_text):
+    parser.add_argument('--' + name, dest=dest, action='store_true',
+                        default=None,
+                        help=help_text + ' (or --no-' + name + ')')
+    parser.add_argument('--no-' + name, dest=dest, action='store_false',
+                        help=argparse.SUPPRESS)
+
+def parse_arguments(parser):
+    args = parser.parse_args()
+
+    batch = getattr(args, 'batch', None) is not None
+    watch = getattr(args, 'watch', None) is not None
+    jobs = getattr(args, 'jobs', None)
+    output_dir = getattr(args, 'output_dir', None)
+
+    if args.no_input and args.save is None and not batch and not watch:
+        parser.error('a save file is required with --no-input')
+    if batch and watch:
+        parser.error('--batch and --watch cannot be used together')
+    if ((batch or watch)
+        and (args.save is not None or args.output is not None)):
+        parser.error('use --output-dir instead of a save file and --output'
+                     ' with --batch or --watch')
+    if not batch and jobs is not None:
+        parser.error('--jobs only applies to --batch')
+    if not batch and not watch and output_dir is not None:
+        parser.error('--output-dir only applies to --batch and --watch')
+    if watch and not os.path.isdir(args.watch):
+        parser.error('not a directory: ' + args.watch)
+    if batch and jobs is not None and jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if (getattr(args, 'compress', None) is not None
+        and args.output is not None):
+        parser.error('--compress only applies to default output names; end'
+                     ' the --output name in .gz or .xz instead')
+    roots = [option for option in ['root_characters', 'root_dynasties',
+                                   'root_titles']
+             if getattr(args, option, None) is not None]
+    if len(roots) > 0:
+        if batch or watch:
+            parser.error('--root-characters, --root-dynasties and'
+                         ' --root-titles cannot be used with --batch or'
+                         ' --watch')
+        if args.mode == 1:
+            parser.error('--root-characters, --root-dynasties and'
+                         ' --root-titles only apply to modes 2 to 5')
+    if getattr(args, 'max_characters', None) is not None:
+        if args.max_characters < 1:
+            parser.error('--max-characters must be at least 1')
+    if getattr(args, 'shard', None) is not None:
+        if batch or watch:
+            parser.error('--shard cannot be used with --batch or --watch')
+        if args.output == '-':
+            parser.error('--shard cannot be used with standard output')
+        if args.incremental is not None:
+            parser.error('--shard cannot be used with --incremental')
+    if batch and args.incremental is not None:
+        parser.error('--incremental cannot be used with --batch')
+    for option in ['sqlite', 'csv', 'tsv']:
+        if (batch or watch) and getattr(args, option, None) is not None:
+            parser.error('--' + option + ' cannot be used with --batch or'
+                         ' --watch')
+    if 'render_jobs' in args and args.render_jobs < 1:
+        parser.error('--render-jobs must be at least 1')
+    if batch and 'render_jobs' in args and args.render_jobs > 1:
+        parser.error('--render-jobs cannot be used with --batch; use --jobs'
+                     ' to convert several saves at the same time instead')
+    if args.no_input and 'mode' in args and args.mode is None:
+        parser.error('--mode is required with --no-input')
+    if args.no_input and args.mods is None:
+        args.mods = []
+
+    for option in ['ck2_install_dir', 'mod_dir', 'debug', 'cull_loners',
+                   'cull_childless_spouses', 'real_fathers',
+                   'generate_titles', 'ancestor_generations',
+                   'descendant_generations', 'include_spouses',
+                   'max_characters']:
+        value = getattr(args, option, None)
+        if value is not None:
+            setattr(settings, option, value)
+
+    if args.report is not None:
+        recorder.enable()
+    if args.profile is not None:
+        profiler.enable(args.profile)
+    if not args.no_progress and sys.stdout.isatty():
+        progress.set_callback(ProgressBar())
+
+    return args
+
+def write_report(args):
+    if args.report is not None:
+        recorder.write_report(args.report)
+        print('### Wrote report to', args.report, '###')
+    if args.profile is not None:
+        profiler.dump(top=args.profile_top)
+        print('### Wrote profiles to', args.profile, '###')
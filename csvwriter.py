@@ -0,0 +1,55 @@
+import sys
+import csv
+import os.path
+
+from gedcomwriter import OUTPUT_BUFFER_SIZE
+from instrumentation import recorder, instrumented
+from progress import progress
+from tablerows import TableRows, tables, batches, ROWS_PER_BATCH
+
+class CsvWriter(TableRows):
+    """Writes one file per table, with a header row of column names.  Empty
+    fields are unknown values."""
+    def __init__(self, tabs=False):
+        if tabs:
+            self.dialect = csv.excel_tab
+            self.extension = '.tsv'
+        else:
+            self.dialect = csv.excel
+            self.extension = '.csv'
+        self.row_counts = {}
+
+    def write_table(self, directory, table, columns):
+        filename = os.path.join(directory, table + self.extension)
+        count = 0
+
+        with open(filename, 'w', encoding='utf-8', newline='',
+                  buffering=OUTPUT_BUFFER_SIZE) as file:
+            writer = csv.writer(file, self.dialect)
+            writer.writerow([c.split()[0] for c in columns])
+
+            for batch in batches(self.table_rows(table), ROWS_PER_BATCH):
+                writer.writerows(batch)
+                count += len(batch)
+
+        self.row_counts[table] = count
+
+    @instrumented('write_csv')
+    def write_csv(self, directory):
+        print('### Writing {0} files with {1} characters to {2}...'.format(
+            self.extension, len(self.character_map), directory))
+        sys.stdout.flush()
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        for i, (table, columns) in enumerate(tables):
+            self.write_table(directory, table, columns)
+            progress.report(i + 1, len(tables), 'tables')
+
+        for table in self.row_counts:
+            recorder.count(self.extension[1:] + '_' + table,
+                           self.row_counts[table])
+
+        print('Done. ###')
+        sys.stdout.flush()
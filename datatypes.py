@@ -712,18 +712,16 @@ class Character(object):
         self.real_father = -1
         self.mother = -1
         self.spouse = []
-        self.children = []
         self.dynasty_id = -1
         self.dynasty_name = ''
         self.title_history = TitleHistory()
         self.government = ''
         self.independent = True
-        self.loner = True
-        self.GEDCOM_id = -1
+        self.component = 0
+        self.GEDCOM_id = ''
         self.FAMS = []
-        self.FAMC = -1
+        self.FAMC = ''
         self.mark = False
-        self.family_marked = False
 
     def inform_title_history(self):
         if self.culture is not None:
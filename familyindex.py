@@ -0,0 +1,235 @@
+import heapq
+from collections import defaultdict, deque
+
+# How far a parent or child, and a spouse, are from a character when
+# choosing the closest relatives; relatives by marriage come after blood
+# relatives of the same generation
+BLOOD_DISTANCE = 1
+MARRIAGE_DISTANCE = 2
+
+class FamilyIndex(object):
+    """Parents, children and spouses of every character, by game id, built
+    once per save.  Only characters that are in the character map are
+    listed.  Parents and children are kept both by presumed and by real
+    father, and spouses are listed on both sides even if the save only
+    lists them on one."""
+    def __init__(self, character_map):
+        self.presumed_parents = {}
+        self.real_parents = {}
+        self.presumed_children = defaultdict(list)
+        self.real_children = defaultdict(list)
+        self.spouses = {}
+        self.real_fathers = {}
+
+        for c in character_map:
+            character = character_map[c]
+
+            parents = [p for p in [character.father, character.mother]
+                       if p in character_map]
+            self.presumed_parents[c] = parents
+            for p in parents:
+                self.presumed_children[p].append(c)
+
+            # Most characters are their presumed father's, so they share
+            # the same list
+            if (character.real_father in character_map
+                and character.real_father != character.father):
+                self.real_fathers[c] = character.real_father
+                parents = [p for p in [character.real_father,
+                                       character.mother]
+                           if p in character_map]
+            self.real_parents[c] = parents
+            for p in parents:
+                self.real_children[p].append(c)
+
+            self.spouses[c] = [s for s in character.spouse
+                               if s in character_map]
+
+        for c in self.spouses:
+            for s in self.spouses[c]:
+                if c not in self.spouses[s]:
+                    self.spouses[s].append(c)
+
+    def father(self, character, real_fathers):
+        # The game id of the father to use, which may be -1 or a character
+        # that is not in the save
+        if real_fathers and character.id in self.real_fathers:
+            return self.real_fathers[character.id]
+        return character.father
+
+    def parents(self, real_fathers):
+        if real_fathers:
+            return self.real_parents
+        return self.presumed_parents
+
+    def children(self, real_fathers):
+        if real_fathers:
+            return self.real_children
+        return self.presumed_children
+
+    def related(self, seeds, ancestor_depth=1, descendant_depth=-1,
+                spouses=True, real_fathers=False):
+        # Returns the seeds, their ancestors up to ancestor_depth generations,
+        # their descendants up to descendant_depth generations, and the
+        # ancestors and spouses of those descendants except for the last
+        # generation.  A negative depth means all generations.
+        parents = self.parents(real_fathers)
+        children = self.children(real_fathers)
+
+        if ancestor_depth < 0:
+            ancestor_depth = len(parents)
+        if descendant_depth < 0:
+            descendant_depth = len(parents)
+
+        marked = set()
+        climbed = {}
+        generation = {}
+        queue = deque()
+
+        for c in seeds:
+            if c not in generation:
+                generation[c] = 0
+                queue.append(c)
+
+        # Breadth first, so that every character is reached in its closest
+        # generation and expanded at most once
+        while len(queue) > 0:
+            c = queue.popleft()
+            g = generation[c]
+            marked.add(c)
+
+            # Seeds are always expanded
+            if g > 0 and g >= descendant_depth:
+                continue
+
+            self.climb(parents, c, ancestor_depth, marked, climbed)
+
+            if spouses:
+                marked.update(self.spouses[c])
+
+            if g >= descendant_depth:
+                continue
+
+            for child in children.get(c, []):
+                if child not in generation:
+                    generation[child] = g + 1
+                    queue.append(child)
+
+        return marked
+
+    def closest(self, seeds, budget, spouses=True, real_fathers=False):
+        # Returns the seeds and their closest relatives, at most budget
+        # characters in all, adding them in order of distance from the
+        # nearest seed.  Characters at the same distance are added in the
+        # order they were found.
+        parents = self.parents(real_fathers)
+        children = self.children(real_fathers)
+
+        marked = set()
+        distance = {}
+        heap = []
+
+        for c in seeds:
+            if c not in distance:
+                distance[c] = 0
+                heap.append((0, len(heap), c))
+
+        found = len(heap)
+
+        while len(heap) > 0 and len(marked) < budget:
+            d, i, c = heapq.heappop(heap)
+
+            # A character can be queued again once a shorter way to it is
+            # found, and the longer ones are skipped
+            if c in marked or d > distance[c]:
+                continue
+            marked.add(c)
+
+            relatives = [(parents[c], BLOOD_DISTANCE),
+                         (children.get(c, []), BLOOD_DISTANCE)]
+            if spouses:
+                relatives.append((self.spouses[c], MARRIAGE_DISTANCE))
+
+            for characters, step in relatives:
+                for r in characters:
+                    if r not in distance or d + step < distance[r]:
+                        distance[r] = d + step
+                        heapq.heappush(heap, (d + step, found, r))
+                        found += 1
+
+        return marked
+
+    def components(self, members, spouses=True, real_fathers=False):
+        # Labels each of the given characters with its connected component,
+        # through parents, children and (with spouses) spouses that are also
+        # given.  Components are numbered from 1, the largest first, and
+        # components of the same size in the order of their first member.
+        # Returns the labels and the size of each component.
+        parents = self.parents(real_fathers)
+        root = {}
+        size = {}
+
+        for c in members:
+            root[c] = c
+            size[c] = 1
+
+        def find(c):
+            # Path halving: every visited character skips its parent
+            while root[c] != c:
+                root[c] = root[root[c]]
+                c = root[c]
+            return c
+
+        def union(a, b):
+            a = find(a)
+            b = find(b)
+            if a == b:
+                return
+            if size[a] < size[b]:
+                a, b = b, a
+            root[b] = a
+            size[a] += size[b]
+
+        for c in members:
+            for p in parents[c]:
+                if p in root:
+                    union(c, p)
+            if spouses:
+                for s in self.spouses[c]:
+                    if s in root:
+                        union(c, s)
+
+        first = {}
+        for i, c in enumerate(members):
+            r = find(c)
+            if r not in first:
+                first[r] = i
+
+        roots = sorted(first, key=lambda r: (-size[r], first[r]))
+        number = {}
+        for i, r in enumerate(roots):
+            number[r] = i + 1
+
+        labels = {}
+        for c in members:
+            labels[c] = number[find(c)]
+
+        return labels, [size[r] for r in roots]
+
+    @staticmethod
+    def climb(parents, c, depth, marked, climbed):
+        # climbed holds how many generations above each character have
+        # already been marked, so shared ancestors are only walked once
+        if depth < 1:
+            return
+
+        stack = [(c, depth)]
+
+        while len(stack) > 0:
+            c, depth = stack.pop()
+
+            for p in parents[c]:
+                marked.add(p)
+                if depth > 1 and climbed.get(p, 0) < depth - 1:
+                    climbed[p] = depth - 1
+                    stack.append((p, depth - 1))
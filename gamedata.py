@@ -1,28 +1,43 @@
 import sys
+import copy
 import zipfile
 import os.path
 from os import listdir
 from string import digits, whitespace
 from datatypes import *
+from titleindex import TitleIndex
+from familyindex import FamilyIndex
+from instrumentation import recorder, instrumented
+from progress import progress, CHARACTERS_PER_CHUNK
+from validator import validate_ck2_data
 import settings
 
 class InstallDirNotFoundError(Exception):
     pass
 
+class ModNotFoundError(Exception):
+    pass
+
 class GameFiles(object):
     def __init__(self):
         self.dir_lists = {'dynasties': [], 'landed_titles': [], 'cultures': [],
                           'religions': [], 'governments': []}
         self.localization = []
 
-    def initialize(self, ck2_install_dir, mod_dir):
+    def initialize(self, ck2_install_dir, mod_dir, mods=None):
         if not os.path.exists(ck2_install_dir):
             raise InstallDirNotFoundError
 
         if not os.path.exists(mod_dir):
             print('Did not find mod directory.  No mods will be loaded.')
+        elif mods is None:
+            mods = self.prompt_for_mods(self.list_mods(mod_dir))
 
-        self.get_mod_files(mod_dir)
+        self.find_files(ck2_install_dir, mod_dir, mods)
+
+    @instrumented('find_game_files')
+    def find_files(self, ck2_install_dir, mod_dir, mods):
+        self.get_mod_files(mod_dir, mods)
         self.get_game_files(ck2_install_dir)
 
         self.dynasties = [(x[0], x[2]) for x in self.dir_lists['dynasties']]
@@ -35,17 +50,15 @@ class GameFiles(object):
 
         self.dir_lists = {}
 
-    def get_mod_files(self, mod_dir):
-        mods = []
-
-        if not os.path.exists(mod_dir):
-            return mods
+    @staticmethod
+    def list_mods(mod_dir):
+        return [d for d in listdir(mod_dir)
+                if (os.path.isdir(os.path.join(mod_dir, d))
+                    or d.endswith('.zip'))]
 
+    @staticmethod
+    def prompt_for_mods(mod_names):
         while True:
-            mod_names = [d for d in listdir(mod_dir)
-                         if (os.path.isdir(os.path.join(mod_dir, d))
-                             or d.endswith('.zip'))]
-
             print('Please specify which mods you used with this save, by'
                   ' number. You can enter multiple numbers separated by'
                   ' spaces.')
@@ -62,11 +75,27 @@ class GameFiles(object):
                 print('Please enter only numbers and spaces.')
                 continue
 
-            try:
-                mods = [mod_names[i-1] for i in mod_numbers]
-                break
-            except KeyError:
+            if len([i for i in mod_numbers
+                    if i < 1 or i > len(mod_names)]) > 0:
                 print('Please only type numbers that appear on this list.')
+                continue
+
+            return [mod_names[i-1] for i in mod_numbers]
+
+    def get_mod_files(self, mod_dir, mods=None):
+        if not os.path.exists(mod_dir):
+            if mods is not None and len(mods) > 0:
+                raise ModNotFoundError(mods[0])
+            return
+
+        mod_names = self.list_mods(mod_dir)
+
+        if mods is None:
+            mods = self.prompt_for_mods(mod_names)
+
+        for m in mods:
+            if m not in mod_names:
+                raise ModNotFoundError(m)
 
         mods = sorted(mods, key=lambda x: x, reverse=True)
 
@@ -148,8 +177,6 @@ class GameFiles(object):
             self.localization += files
 
 class GameData(object):
-    special_chars = ['{', '}', '=', '"', '#']
-
     def __init__(self):
         self.debug_all = False
         self.debug_save = False
@@ -160,12 +187,13 @@ class GameData(object):
         self.debug_governments = False
 
         self.game_files = GameFiles()
+        self.diagnostics = []
 
         if os.path.exists('parse.log'):
             os.remove('parse.log')
 
-    def initialize(self, ck2_install_dir, mod_dir):
-        self.game_files.initialize(ck2_install_dir, mod_dir)
+    def initialize(self, ck2_install_dir, mod_dir, mods=None):
+        self.game_files.initialize(ck2_install_dir, mod_dir, mods)
 
         self.read_dynasties()
         self.read_cultures()
@@ -173,6 +201,7 @@ class GameData(object):
         self.read_landed_titles()
         self.read_governments()
         self.read_localization()
+        self.write_diagnostics()
 
     @staticmethod
     def parse_date(date_string):
@@ -205,11 +234,9 @@ class GameData(object):
         return ' '.join(parts[1:])
 
     @classmethod
-    def parse_ck2_data(cls, data, debug=False, is_save=False, 
-                       empty_values=False):
+    def parse_ck2_data(cls, data, is_save=False, empty_values=False):
         current_keys = []
         current_value = ''
-        current_line = 1
 
         if is_save:
             state = 'begin'
@@ -219,200 +246,165 @@ class GameData(object):
         saved_state = ''
         temp_string = ''
 
-        chars_per_increment = int(len(data) / 80) + 1
-        chars_until_progress = chars_per_increment
-
-        if debug:
-            debug_file = open('parse.log', 'a')
-
-        for x in data:
-            chars_until_progress -= 1
-            if chars_until_progress == 0:
-                print('=', end='')
-                sys.stdout.flush()
-                chars_until_progress = chars_per_increment
-
-            if x == '\n':
-                current_line += 1
-
-            if state == 'begin':
-                if temp_string == 'CK2txt':
-                    state = 'expect_key'
-                    temp_string = ''
-                else:
-                    temp_string += x
+        for start in range(0, len(data), CHARACTERS_PER_CHUNK):
+            for x in data[start:start + CHARACTERS_PER_CHUNK]:
+                if state == 'begin':
+                    if temp_string == 'CK2txt':
+                        state = 'expect_key'
+                        temp_string = ''
+                    else:
+                        temp_string += x
 
-            elif state == 'expect_key':
-                if x == '}' and len(current_keys) > 0:
-                    if empty_values:
-                        yield (current_keys, current_value)
-                    current_keys = current_keys[:-1]
-                elif x == '{':
-                    current_keys.append('')
-                elif x == '#':
-                    saved_state = 'expect_key'
-                    state = 'comment'
-                elif x in cls.special_chars and debug:
-                    debug_file.write('Unexpected character ' + x + ' on line '
-                                     + repr(current_line) + ' (expect_key)')
-                elif x not in whitespace:
-                    temp_string = x
-                    state = 'key'
-
-            elif state == 'key':
-                if x == '=':
-                    current_keys.append(temp_string)
-                    temp_string = ''
-                    state = 'expect_value'
-                elif x == '}':      # e.g. societies={2}
-                    current_value = [temp_string]
-                    yield (current_keys, current_value)
-                    temp_string = ''
-                    current_value = ''
-                    if len(current_keys) > 0:
-                        current_keys = current_keys[:-1]
-                    state = 'expect_key'
-                elif x in cls.special_chars and debug:
-                    debug_file.write('Unexpected character in key: ' + x + 
-                                     ' on line ' + repr(current_line) + 
-                                     ' (key)')
-                elif x not in whitespace:
-                    temp_string += x
-                elif temp_string != '':
-                    current_value = [temp_string]
-                    temp_string = ''
-                    state = 'list'
-
-            elif state == 'expect_value':
-                if x == '"':
-                    state = 'quoted_value'
-                    temp_string = ''
-                elif x == '{':
-                    state = 'expect_key'
-                elif x in cls.special_chars and debug:
-                    debug_file.write('Unexpected character ' + x + ' on line '
-                                     + repr(current_line) + ' (expect_value)')
-                elif x not in whitespace:
-                    temp_string = x
-                    state = 'value'
-
-            elif state == 'value':
-                if x in whitespace or x == '}':
-                    current_value = temp_string
-                    temp_string = ''
-                    yield (current_keys, current_value)
-                    current_value = ''
-                    if len(current_keys) > 0:
-                        current_keys = current_keys[:-1]
+                elif state == 'expect_key':
                     if x == '}' and len(current_keys) > 0:
+                        if empty_values:
+                            yield (current_keys, current_value)
                         current_keys = current_keys[:-1]
-                    state = 'expect_key'
-                elif x == '{':
-                    current_value = temp_string
-                    temp_string = ''
-                    yield (current_keys, current_value)
-                    current_value = ''
-                    if len(current_keys) > 0:
-                        current_keys = current_keys[:-1]
-                    current_keys.append('')
-                    state = 'expect_key'
-                elif x == '#':
-                    current_value = temp_string
-                    temp_string = ''
-                    yield (current_keys, current_value)
-                    current_value = ''
-                    if len(current_keys) > 0:
-                        current_keys = current_keys[:-1]
-                    saved_state = 'expect_key'
-                    state = 'comment'
-                elif x in cls.special_chars and debug:
-                    debug_file.write('Unexpected character ' + x + ' on line '
-                                     + current_line + ' (value)')
-                else:
-                    temp_string += x
-
-            elif state == 'quoted_value':
-                if x == '"':
-                    current_value = temp_string
-                    temp_string = ''
-                    yield (current_keys, current_value)
-                    current_value = ''
-                    if len(current_keys) > 0:
-                        current_keys = current_keys[:-1]
-                    state = 'expect_key'
-                else:
-                    temp_string += x
+                    elif x == '{':
+                        current_keys.append('')
+                    elif x == '#':
+                        saved_state = 'expect_key'
+                        state = 'comment'
+                    elif x not in whitespace:
+                        temp_string = x
+                        state = 'key'
+
+                elif state == 'key':
+                    if x == '=':
+                        current_keys.append(temp_string)
+                        temp_string = ''
+                        state = 'expect_value'
+                    elif x == '}':      # e.g. societies={2}
+                        current_value = [temp_string]
+                        yield (current_keys, current_value)
+                        temp_string = ''
+                        current_value = ''
+                        if len(current_keys) > 0:
+                            current_keys = current_keys[:-1]
+                        state = 'expect_key'
+                    elif x not in whitespace:
+                        temp_string += x
+                    elif temp_string != '':
+                        current_value = [temp_string]
+                        temp_string = ''
+                        state = 'list'
+
+                elif state == 'expect_value':
+                    if x == '"':
+                        state = 'quoted_value'
+                        temp_string = ''
+                    elif x == '{':
+                        state = 'expect_key'
+                    elif x not in whitespace:
+                        temp_string = x
+                        state = 'value'
+
+                elif state == 'value':
+                    if x in whitespace or x == '}':
+                        current_value = temp_string
+                        temp_string = ''
+                        yield (current_keys, current_value)
+                        current_value = ''
+                        if len(current_keys) > 0:
+                            current_keys = current_keys[:-1]
+                        if x == '}' and len(current_keys) > 0:
+                            current_keys = current_keys[:-1]
+                        state = 'expect_key'
+                    elif x == '{':
+                        current_value = temp_string
+                        temp_string = ''
+                        yield (current_keys, current_value)
+                        current_value = ''
+                        if len(current_keys) > 0:
+                            current_keys = current_keys[:-1]
+                        current_keys.append('')
+                        state = 'expect_key'
+                    elif x == '#':
+                        current_value = temp_string
+                        temp_string = ''
+                        yield (current_keys, current_value)
+                        current_value = ''
+                        if len(current_keys) > 0:
+                            current_keys = current_keys[:-1]
+                        saved_state = 'expect_key'
+                        state = 'comment'
+                    else:
+                        temp_string += x
 
-            elif state == 'list':
-                if x == '}':
-                    yield (current_keys, current_value)
-                    current_value = ''
-                    if len(current_keys) > 0:
-                        current_keys = current_keys[:-1]
-                    state = 'expect_key'
-                elif x == '=' and len(current_value) == 1:  
-                    # oops it's actually a key
-                    current_keys.append(current_value[0])
-                    current_value = ''
-                    temp_string = ''
-                    state = 'expect_value'
-                elif x == '#':
-                    saved_state = 'list'
-                    state = 'comment'
-                elif x == '"':
-                    state = 'quoted_list_item'
-                    temp_string = ''
-                elif x in cls.special_chars and debug:
-                    debug_file.write('Unexpected character ' + x + ' on line '
-                                     + repr(current_line) + ' (list)')
-                elif x not in whitespace:
-                    temp_string = x
-                    state = 'list_item'
-
-            elif state == 'list_item':
-                if x == '}':
-                    current_value.append(temp_string)
-                    temp_string = ''
-                    yield (current_keys, current_value)
-                    current_value = ''
-                    if len(current_keys) > 0:
-                        current_keys = current_keys[:-1]
-                    state = 'expect_key'
-                elif x in whitespace:
-                    current_value.append(temp_string)
-                    temp_string = ''
-                    state = 'list'
-                elif x == '#':
-                    current_value.append(temp_string)
-                    temp_string = ''
-                    saved_state = 'list'
-                    state = 'comment'
-                elif x in cls.special_chars and debug:
-                    debug_file.write('Unexpected character ' + x + ' on line '
-                                     + repr(current_line) + ' (list_item)')
-                else:
-                    temp_string += x
+                elif state == 'quoted_value':
+                    if x == '"':
+                        current_value = temp_string
+                        temp_string = ''
+                        yield (current_keys, current_value)
+                        current_value = ''
+                        if len(current_keys) > 0:
+                            current_keys = current_keys[:-1]
+                        state = 'expect_key'
+                    else:
+                        temp_string += x
 
-            elif state == 'quoted_list_item':
-                if x == '"':
-                    current_value.append(temp_string)
-                    temp_string = ''
-                    state = 'list'
-                else:
-                    temp_string += x
+                elif state == 'list':
+                    if x == '}':
+                        yield (current_keys, current_value)
+                        current_value = ''
+                        if len(current_keys) > 0:
+                            current_keys = current_keys[:-1]
+                        state = 'expect_key'
+                    elif x == '=' and len(current_value) == 1:  
+                        # oops it's actually a key
+                        current_keys.append(current_value[0])
+                        current_value = ''
+                        temp_string = ''
+                        state = 'expect_value'
+                    elif x == '#':
+                        saved_state = 'list'
+                        state = 'comment'
+                    elif x == '"':
+                        state = 'quoted_list_item'
+                        temp_string = ''
+                    elif x not in whitespace:
+                        temp_string = x
+                        state = 'list_item'
+
+                elif state == 'list_item':
+                    if x == '}':
+                        current_value.append(temp_string)
+                        temp_string = ''
+                        yield (current_keys, current_value)
+                        current_value = ''
+                        if len(current_keys) > 0:
+                            current_keys = current_keys[:-1]
+                        state = 'expect_key'
+                    elif x in whitespace:
+                        current_value.append(temp_string)
+                        temp_string = ''
+                        state = 'list'
+                    elif x == '#':
+                        current_value.append(temp_string)
+                        temp_string = ''
+                        saved_state = 'list'
+                        state = 'comment'
+                    else:
+                        temp_string += x
 
-            elif state == 'comment':
-                if x == '\n':
-                    state = saved_state
-                    saved_state = ''
+                elif state == 'quoted_list_item':
+                    if x == '"':
+                        current_value.append(temp_string)
+                        temp_string = ''
+                        state = 'list'
+                    else:
+                        temp_string += x
 
-        print('')
+                elif state == 'comment':
+                    if x == '\n':
+                        state = saved_state
+                        saved_state = ''
 
-        if debug:
-            debug_file.close()
+            progress.report(min(start + CHARACTERS_PER_CHUNK, len(data)),
+                            len(data), 'characters')
 
     @staticmethod
-    def read_file(filename, location, debug):
+    def read_file(filename, location):
         if location == '':
             print('### Now reading', filename, '###')
 
@@ -427,11 +419,6 @@ class GameData(object):
                 print(' #######################')
                 return ''
 
-            if debug:
-                debug_file = open('parse.log', 'a')
-                debug_file.write('Parsing ' + filename)
-                debug_file.close()
-
         else:
             print('### Now reading', filename, 'in', location, '###')
 
@@ -447,13 +434,25 @@ class GameData(object):
                 print(' #######################')
                 return ''
 
-            if debug:
-                debug_file = open('parse.log', 'a')
-                debug_file.write('Parsing ' + filename + ' in ' + location)
-                debug_file.close()
-
+        recorder.count('bytes_read', len(file_contents))
         return file_contents
 
+    def validate(self, file_contents, filename, is_save=False):
+        for diagnostic in validate_ck2_data(file_contents, is_save):
+            self.diagnostics.append((filename, diagnostic))
+
+    def write_diagnostics(self):
+        if len(self.diagnostics) == 0:
+            return
+
+        with open('parse.log', 'a') as debug_file:
+            for filename, diagnostic in self.diagnostics:
+                debug_file.write(filename + ': ' + str(diagnostic) + '\n')
+
+        print('###', len(self.diagnostics), 'parser warnings written to'
+              ' parse.log ###')
+
+    @instrumented('read_dynasties')
     def read_dynasties(self):
         if len(self.game_files.dynasties) == 0:
             print('')
@@ -466,9 +465,13 @@ class GameData(object):
         debug = self.debug_all or self.debug_dynasties
 
         for filename, location in self.game_files.dynasties:
-            file_contents = self.read_file(filename, location, debug)
+            file_contents = self.read_file(filename, location)
+
+            if debug:
+                self.validate(file_contents, filename)
 
-            for keys, value in self.parse_ck2_data(file_contents, debug):
+            for keys, value in recorder.counted(
+                    self.parse_ck2_data(file_contents), 'tokens'):
                 if len(keys) >= 2 and self.is_integer(keys[0]):
                     id = int(keys[0])
 
@@ -489,6 +492,7 @@ class GameData(object):
                           keys[2] == 'religion'):
                         dynasty.religion = value
 
+    @instrumented('read_cultures')
     def read_cultures(self):
         if len(self.game_files.cultures) == 0:
             print('')
@@ -502,9 +506,13 @@ class GameData(object):
         debug = self.debug_all or self.debug_cultures
 
         for filename, location in self.game_files.cultures:
-            file_contents = self.read_file(filename, location, debug)
+            file_contents = self.read_file(filename, location)
 
-            for keys, value in self.parse_ck2_data(file_contents, debug):
+            if debug:
+                self.validate(file_contents, filename)
+
+            for keys, value in recorder.counted(
+                    self.parse_ck2_data(file_contents), 'tokens'):
                 if len(keys) == 3 and keys[1] not in self.culture_map:
                     culture = Culture()
                     culture.id = keys[1]
@@ -527,6 +535,7 @@ class GameData(object):
 
                         self.name_map[parts[0]] = parts[1]
 
+    @instrumented('read_religions')
     def read_religions(self):
         if len(self.game_files.religions) == 0:
             print('')
@@ -540,9 +549,13 @@ class GameData(object):
         debug = self.debug_all or self.debug_religions
 
         for filename, location in self.game_files.religions:
-            file_contents = self.read_file(filename, location, debug)
+            file_contents = self.read_file(filename, location)
+
+            if debug:
+                self.validate(file_contents, filename)
 
-            for keys, value in self.parse_ck2_data(file_contents, debug):
+            for keys, value in recorder.counted(
+                    self.parse_ck2_data(file_contents), 'tokens'):
                 if len(keys) == 3 and keys[1] not in self.religion_map:
                     religion = Religion()
                     religion.id = keys[1]
@@ -553,6 +566,7 @@ class GameData(object):
                     self.religion_map[keys[1]].priest_title = value
                     self.misc_localization[value] = ''
 
+    @instrumented('read_landed_titles')
     def read_landed_titles(self):
         if len(self.game_files.landed_titles) == 0:
             print('')
@@ -565,10 +579,14 @@ class GameData(object):
         debug = self.debug_all or self.debug_landed_titles
 
         for filename, location in self.game_files.landed_titles:
-            file_contents = self.read_file(filename, location, debug)
+            file_contents = self.read_file(filename, location)
 
-            for keys, value in self.parse_ck2_data(file_contents, debug,
-                                                   empty_values=True):
+            if debug:
+                self.validate(file_contents, filename)
+
+            for keys, value in recorder.counted(
+                    self.parse_ck2_data(file_contents, empty_values=True),
+                    'tokens'):
                 if len(keys) > 1 and keys[-2] not in self.title_map:
                     title = Title()
                     title.id = keys[-2]
@@ -619,6 +637,7 @@ class GameData(object):
                     title.rank = BARON
                     self.title_map[keys[-1]] = title
 
+    @instrumented('read_governments')
     def read_governments(self):
         if len(self.game_files.governments) == 0:
             print('')
@@ -631,15 +650,20 @@ class GameData(object):
         debug = self.debug_all or self.debug_governments
 
         for filename, location in self.game_files.governments:
-            file_contents = self.read_file(filename, location, debug)
+            file_contents = self.read_file(filename, location)
+
+            if debug:
+                self.validate(file_contents, filename)
 
-            for keys, value in self.parse_ck2_data(file_contents, debug):
+            for keys, value in recorder.counted(
+                    self.parse_ck2_data(file_contents), 'tokens'):
                 if len(keys) == 3 and keys[1] not in self.government_map:
                     self.government_map[keys[1]] = ''
 
                 if len(keys) == 3 and keys[2] == 'title_prefix':
                     self.government_map[keys[1]] = value.strip('_')
 
+    @instrumented('read_localization')
     def read_localization(self):
         if len(self.game_files.localization) == 0:
             print('')
@@ -842,17 +866,29 @@ class GameData(object):
                 and self.misc_localization[priest_title] != ''):
                 priest_title = self.misc_localization[priest_title]
 
+    def copy_for_save(self):
+        # read_save adds to and renames dynasties and titles, so each save
+        # needs its own copy of those to leave the static game data reusable
+        game_data = copy.copy(self)
+        game_data.dynasty_map = copy.deepcopy(self.dynasty_map)
+        game_data.title_map = copy.deepcopy(self.title_map)
+        return game_data
+
+    @instrumented('read_save')
     def read_save(self, filename, generate_titles):
         self.character_map = {}
+        self.diagnostics = []
         self.player_id = -1
         debug = self.debug_all or self.debug_save
 
-        filename = os.path.basename(filename)
-
         try:
-            file_contents = self.read_file(filename, filename, debug)
+            file_contents = self.read_file(os.path.basename(filename),
+                                           filename)
         except zipfile.BadZipfile:
-            file_contents = self.read_file(filename, '', debug)
+            file_contents = self.read_file(filename, '')
+
+        if debug:
+            self.validate(file_contents, filename, is_save=True)
 
         date = []
         title_id = ''
@@ -861,8 +897,9 @@ class GameData(object):
         prev_holder = 0
         succession_type = ''
 
-        for keys, value in self.parse_ck2_data(file_contents, debug, 
-                                               is_save=True):
+        for keys, value in recorder.counted(
+                self.parse_ck2_data(file_contents, is_save=True),
+                'tokens'):
             if (len(keys) == 2 and keys[0] == 'player' and keys[1] == 'id'
                 and self.is_integer(value)):
                 self.player_id = int(value)
@@ -1143,7 +1180,14 @@ class GameData(object):
         for c in self.character_map:
             self.character_map[c].inform_title_history()
 
-    def mark_characters(self, real_fathers):
+        self.title_index = TitleIndex(self.character_map, self.title_map)
+        self.family_index = FamilyIndex(self.character_map)
+        self.write_diagnostics()
+
+        recorder.count('characters', len(self.character_map))
+
+    @staticmethod
+    def prompt_for_mode():
         while True:
             print('Possible modes:')
             print('1) Entire tree (warning: probably very large)')
@@ -1153,129 +1197,151 @@ class GameData(object):
             print('   their children')
             print('4) Your dynasty members, and their spouses and parents') 
             print('   (for very large dynasties)')
+            print('5) Your dynasty members and their closest relatives, up to')
+            print('   ' + str(settings.max_characters) + ' characters')
             print('Enter a number: ', end=' ')
             sys.stdout.flush()
             mode = sys.stdin.readline().strip()
             try:
                 mode = int(mode)
-                if 1 <= mode <= 4:
-                    break
+                if 1 <= mode <= 5:
+                    return mode
             except ValueError:
                 print('Please enter a number.')
 
+    def mark_characters(self, real_fathers, mode=None, characters=None,
+                        dynasties=None, titles=None):
+        if mode is None:
+            mode = self.prompt_for_mode()
+
+        return self.mark_characters_in_mode(real_fathers, mode, characters,
+                                            dynasties, titles)
+
+    def find_seeds(self, characters=None, dynasties=None, titles=None):
+        # The given characters, the members of the given dynasties and
+        # everyone who held one of the given titles, or None if any of them
+        # is not in the save
+        seeds = []
+
+        for c in characters or []:
+            if c not in self.character_map:
+                print('Character', c, 'is not in the save.')
+                return None
+            seeds.append(c)
+
+        if dynasties:
+            for d in dynasties:
+                if d not in self.dynasty_map:
+                    print('Dynasty', d, 'is not in the save or game files.')
+                    return None
+
+            dynasties = set(dynasties)
+            seeds += [c for c in self.character_map
+                      if self.character_map[c].dynasty_id in dynasties]
+
+        for t in titles or []:
+            if t not in self.title_map:
+                print('Title', t, 'is not in the save or game files.')
+                return None
+            seeds += [tenure.holder
+                      for tenure in self.title_index.succession(t)]
+
+        if len(seeds) == 0:
+            print('None of the given dynasties or titles have any'
+                  ' characters.')
+            return None
+
+        return seeds
+
+    @instrumented('mark_characters')
+    def mark_characters_in_mode(self, real_fathers, mode, characters=None,
+                                dynasties=None, titles=None):
         if mode == 1:
             print('Ok. Generating entire tree.\n')
         elif mode == 2:
             print('Ok. Generating extended dynasty tree.\n')
         elif mode == 3:
             print('Ok. Generating standard dynasty tree.\n')
-        else:
+        elif mode == 4:
             print('Ok. Generating abbreviated dynasty tree.\n')
+        else:
+            print('Ok. Generating tree of the closest relatives.\n')
             
         sys.stdout.flush()
 
-        if self.player_id not in self.character_map and mode != 1:
+        if characters or dynasties or titles:
+            seeds = self.find_seeds(characters, dynasties, titles)
+            if seeds is None:
+                return False
+
+        elif self.player_id not in self.character_map and mode != 1:
             print('Your game appears to have been saved in observer mode.'
                   ' Please reload it and select a character in order to use'
-                  '  mode 2, 3, or 4.')
+                  '  mode 2, 3, 4 or 5, or choose the characters, dynasties or'
+                  ' titles to start from.')
             return False
 
-        elif self.player_id in self.character_map:
+        elif mode != 1:
             player_dynasty = self.character_map[self.player_id].dynasty_id
+            seeds = [c for c in self.character_map
+                     if self.character_map[c].dynasty_id == player_dynasty]
 
         if mode == 1:
             for c in self.character_map:
                 self.character_map[c].mark = True
 
-        elif mode == 2:
-            for c in self.character_map:
-                character = self.character_map[c]
-
-                if (real_fathers 
-                    and character.real_father in self.character_map):
-                    father_id = character.real_father
-                else:
-                    father_id = character.father
-
-                if father_id in self.character_map:
-                    self.character_map[father_id].children.append(c)
-                if character.mother in self.character_map:
-                    self.character_map[character.mother].children.append(c)
-
-            for c in self.character_map:
-                character = self.character_map[c]
-
-                if character.dynasty_id == player_dynasty:
-                    self.mark_character_and_family(c, real_fathers)
-
-        elif mode == 3:
-            for c in self.character_map:
-                character = self.character_map[c]
-
-                if character.dynasty_id == player_dynasty:
-                    self.mark_character_and_family(c, real_fathers)
-
-                else:
-                    if (real_fathers 
-                        and character.real_father in self.character_map):
-                        father_id = character.real_father
-                    else:
-                        father_id = character.father
-
-                    mother_id = character.mother
-
-                    if (father_id in self.character_map
-                        and (self.character_map[father_id].dynasty_id == 
-                                player_dynasty)):
-                        character.mark = True
-                    if (mother_id in self.character_map
-                        and (self.character_map[mother_id].dynasty_id == 
-                                 player_dynasty)):
-                        character.mark = True
+        elif mode == 5:
+            for c in self.family_index.closest(seeds,
+                                               settings.max_characters,
+                                               settings.include_spouses,
+                                               real_fathers):
+                self.character_map[c].mark = True
 
         else:
-            for c in self.character_map:
-                character = self.character_map[c]
+            # Modes 2, 3 and 4 include all, one or no generations of
+            # descendants, unless settings.py says otherwise
+            ancestor_depth = 1
+            descendant_depth = {2: -1, 3: 1, 4: 0}[mode]
+
+            if settings.ancestor_generations is not None:
+                ancestor_depth = settings.ancestor_generations
+            if settings.descendant_generations is not None:
+                descendant_depth = settings.descendant_generations
+
+            for c in self.family_index.related(seeds, ancestor_depth,
+                                               descendant_depth,
+                                               settings.include_spouses,
+                                               real_fathers):
+                self.character_map[c].mark = True
 
-                if character.dynasty_id == player_dynasty:
-                    self.mark_character_and_family(c, real_fathers)
+        if recorder.enabled:
+            recorder.count('marked_characters',
+                           len([c for c in self.character_map
+                                if self.character_map[c].mark]))
 
         return True
 
-    def mark_character_and_family(self, character_id, real_fathers):
-        character = self.character_map[character_id]
-        character.mark = True
-
-        if character.family_marked:
-            return
-        else:
-            character.family_marked = True
-
-        if real_fathers and character.real_father in self.character_map:
-            father_id = character.real_father
-        else:
-            father_id = character.father
-
-        if father_id in self.character_map:
-            self.character_map[father_id].mark = True
-        if character.mother in self.character_map:
-            self.character_map[character.mother].mark = True
-        for s in character.spouse:
-            self.character_map[s].mark = True
-        for c in character.children:
-            self.mark_character_and_family(c, real_fathers)
 
+def exit_with_error(interactive):
+    # Interactive users launching the script by double-clicking need a
+    # chance to read the error before the window closes
+    if interactive:
+        sys.stdout.flush()
+        sys.stdin.readline()
+    sys.exit(1)
 
-def prepare_game_data():
+def initialize_game_data(mods=None, interactive=True):
     game_data = GameData()
 
     try:
-        game_data.initialize(settings.ck2_install_dir, settings.mod_dir)
+        game_data.initialize(settings.ck2_install_dir, settings.mod_dir, mods)
     except InstallDirNotFoundError:
         print('Did not find CK2 install dir:', settings.ck2_install_dir)
         print('Please modify settings.py to use the correct path.')
-        sys.stdin.readline()
-        sys.exit()
+        exit_with_error(interactive)
+    except ModNotFoundError as e:
+        print('Did not find mod', str(e), 'in', settings.mod_dir)
+        exit_with_error(interactive)
     except Exception:
         if settings.debug:
             raise
@@ -1284,13 +1350,19 @@ def prepare_game_data():
             print('Check that the locations in settings.py are correct.')
             print('Otherwise please post to the Paradox Interactive Forums'
 		  ' thread, noting any mods you are using.')
-            sys.stdin.readline()
-            sys.exit()
+            exit_with_error(interactive)
+
+    return game_data
+
+def prepare_game_data(filename=None, mods=None, interactive=True):
+    game_data = initialize_game_data(mods, interactive)
+
+    if filename is None:
+        print('\nPlease enter the name of your save file, without the .ck2: ',
+              end=' ')
+        sys.stdout.flush()
+        filename = sys.stdin.readline().strip()
 
-    print('\nPlease enter the name of your save file, without the .ck2: ', 
-	  end=' ')
-    sys.stdout.flush()
-    filename = sys.stdin.readline().strip()
     if filename.endswith('.ck2'):
         filename = filename[:-4]
 
@@ -1298,8 +1370,7 @@ def prepare_game_data():
 
     if not os.path.exists(filename + '.ck2'):
         print('Could not find save file: ', filename + '.ck2')
-        sys.stdin.readline()
-        sys.exit()
+        exit_with_error(interactive)
 
     try:
         game_data.read_save(filename + '.ck2', settings.generate_titles)
@@ -1312,7 +1383,6 @@ def prepare_game_data():
             print('If that is not the problem, please post to the Paradox'
 		          ' Interactive Forums thread, upload your save and note any'
 		          ' mods you are using.')
-            sys.stdin.readline()
-            sys.exit()
+            exit_with_error(interactive)
 
     return game_data, filename
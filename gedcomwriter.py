@@ -1,6 +1,31 @@
 import settings
 from datatypes import Date
+from instrumentation import recorder, instrumented
+from progress import progress, chunks, RECORDS_PER_CHUNK
 import sys
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os.path
+import multiprocessing
+from collections import defaultdict
+
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Output name meaning standard output
+STDOUT = '-'
+
+# The writer whose records are rendered by worker processes.  It is set
+# before the pool is created, so forked workers inherit it.
+shared_writer = None
+
+def render_shared_chunk(task):
+    return shared_writer.render_chunk(task)
+
+def write_shared_shard(shard):
+    return shared_writer.write_shard(shard)
 
 class Family(object):
     """Stores information relevant to a family (GEDCOM definition)."""
@@ -14,31 +39,33 @@ class GedcomWriter(object):
     def __init__(self):
         self.family_map = {}
         self.gedcom_map = {}
+        self.fingerprints = None
+        self.shard = None
+        self.shard_of = {}
+        self.shard_files = {}
+        self.shard_individuals = {}
+        self.shard_families = {}
 
     def initialize(self, game_data):
         self.character_map = game_data.character_map
         self.title_map = game_data.title_map
+        self.family_index = game_data.family_index
 
         self.generate_gedcom_families()
 
+    @instrumented('generate_gedcom_families')
     def generate_gedcom_families(self):
         print('### Generating GEDCOM family information...', end=' ')
         sys.stdout.flush()
 
-        family_id = 1
-
         for c in self.character_map:
             character = self.character_map[c]
 
             if not character.mark:
                 continue
 
-            if (settings.real_fathers 
-                and character.real_father in self.character_map):
-                father_id = character.real_father
-            else:
-                father_id = character.father
-
+            father_id = self.family_index.father(character,
+                                                 settings.real_fathers)
             mother_id = character.mother
 
             if (father_id in self.character_map 
@@ -51,9 +78,6 @@ class GedcomWriter(object):
                 generate_parents = False
 
             if generate_parents:
-                character.loner = False
-
-                
                 if father_id < mother_id:
                     temp = (father_id, mother_id)
                 else:
@@ -61,38 +85,31 @@ class GedcomWriter(object):
 
                 if temp not in self.family_map:
                     family = Family()
-                    family.id = family_id
+                    family.id = self.family_xref(temp)
                     family.father = father_id
                     family.mother = mother_id
                     family.children.append(c)
                     self.family_map[temp] = family
 
                     if father_id in self.character_map:
-                        self.character_map[father_id].FAMS.append(family_id)
-                        self.character_map[father_id].loner = False
+                        self.character_map[father_id].FAMS.append(family.id)
                     if mother_id in self.character_map:
-                        self.character_map[mother_id].FAMS.append(family_id)
-                        self.character_map[mother_id].loner = False
+                        self.character_map[mother_id].FAMS.append(family.id)
 
-                    character.FAMC = family_id
-
-                    family_id += 1
+                    character.FAMC = family.id
 
                 else:
                     family = self.family_map[temp]
                     family.children.append(c)
                     character.FAMC = family.id
 
-            if (len(character.spouse) > 0 
-                and not settings.cull_childless_spouses):
-                for s in character.spouse:
+            if not settings.cull_childless_spouses:
+                for s in self.family_index.spouses[c]:
                     spouse = self.character_map[s]
 
                     if not spouse.mark:
                         continue
 
-                    character.loner = False
-
                     #if character.gender == 1 and spouse.gender == 0:
                     #  temp = (c, s)
                     #elif character.gender == 0 and spouse.gender == 1:
@@ -108,7 +125,7 @@ class GedcomWriter(object):
 
                     if temp not in self.family_map:
                         family = Family()
-                        family.id = family_id
+                        family.id = self.family_xref(temp)
 
                         if character.gender == 1:
                             family.father = character.id
@@ -119,142 +136,425 @@ class GedcomWriter(object):
 
                         self.family_map[temp] = family
 
-                        character.FAMS.append(family_id)
-                        spouse.FAMS.append(family_id)
-                        spouse.loner = False
+                        character.FAMS.append(family.id)
+                        spouse.FAMS.append(family.id)
 
-                        family_id += 1
+        # Characters are loners if they are alone in their component, i.e.
+        # have no marked parent, child or (unless childless spouses are
+        # culled) spouse
+        marked = [c for c in self.character_map
+                  if self.character_map[c].mark]
+        labels, self.component_sizes = self.family_index.components(
+            marked, not settings.cull_childless_spouses, settings.real_fathers
+        )
 
-        gedcom_id = 1
-
-        for c in self.character_map:
+        for c in marked:
             character = self.character_map[c]
+            character.component = labels[c]
 
-            if not character.mark:
-                continue
+            if (self.component_sizes[character.component - 1] > 1
+                or not settings.cull_loners):
+                character.GEDCOM_id = 'I' + str(c)
+                self.gedcom_map[character.GEDCOM_id] = c
 
-            if not character.loner or not settings.cull_loners:
-                character.GEDCOM_id = gedcom_id
-                self.gedcom_map[gedcom_id] = c
-                gedcom_id += 1
+        recorder.count('individuals', len(self.gedcom_map))
+        recorder.count('families', len(self.family_map))
+        recorder.count('components', len(self.component_sizes))
+        recorder.count('loners', self.component_sizes.count(1))
+        if len(self.component_sizes) > 0:
+            recorder.maximum('largest_component', self.component_sizes[0])
 
         print('Done. ###')
 
-    def write_gedcom(self, filename):
+    @staticmethod
+    def family_xref(key):
+        # Families are keyed by the game ids of both parents (or spouses),
+        # the lower one first, and -1 for an unknown parent
+        if key[0] == -1:
+            return 'F' + str(key[1])
+        else:
+            return 'F' + str(key[0]) + '_' + str(key[1])
+
+    def individual_record(self, g):
+        character = self.character_map[self.gedcom_map[g]]
+
+        if character.gender == 0:
+            gender_string = 'F'
+        else:
+            gender_string = 'M'
+
+        record = ['\n0 @', g, '@ INDI',
+                  '\n1 NAME ', character.birth_name, ' /',
+                  character.dynasty_name.upper(), '/',
+                  '\n2 GIVN ', character.birth_name,
+                  '\n2 SURN ', character.dynasty_name,
+                  '\n1 SEX ', gender_string,
+                  '\n1 OCCU ', character.get_primary_title(self.title_map)]
+
+        for s in character.get_years_of_rule(self.title_map):
+            record += ['\n1 NOTE ', s]
+
+        record += ['\n1 NOTE Game ID# ', str(character.id)]
+
+        if (settings.real_fathers 
+            and character.real_father in self.character_map
+            and character.father in self.character_map):
+            father = self.character_map[character.father]
+            record += ['\n1 NOTE Presumed father is ', father.birth_name, ' ',
+                       father.dynasty_name, ' (', str(character.father), ')']
+
+        elif (settings.real_fathers 
+              and character.real_father in self.character_map):
+            record.append('\n1 NOTE Father unknown')
+
+        elif (not settings.real_fathers
+              and character.real_father in self.character_map):
+            real_father = self.character_map[character.real_father]
+            record += ['\n1 NOTE Real father is ', real_father.birth_name, ' ',
+                       real_father.dynasty_name, ' (',
+                       str(character.real_father), ')']
+
+        if type(character.birthday) is Date:
+            record += ['\n1 BIRT\n2 DATE ', character.birthday.gedcom_string()]
+
+        if type(character.deathday) is Date:
+            record += ['\n1 DEAT\n2 DATE ', character.deathday.gedcom_string()]
+
+        for f in character.FAMS:
+            if self.shard is None or self.shard_of[f] == self.shard:
+                record += ['\n1 FAMS @', f, '@']
+            else:
+                record += self.elsewhere('Family', f)
+
+        f = character.FAMC
+        if f != '':
+            if self.shard is None or self.shard_of[f] == self.shard:
+                record += ['\n1 FAMC @', f, '@']
+            else:
+                record += self.elsewhere('Parents', f)
+
+        return ''.join(record)
+
+    def family_record(self, f):
+        family = self.family_map[f]
+
+        record = ['\n0 @', family.id, '@ FAM']
+
+        if family.father in self.character_map:
+            record += self.member('HUSB', 'Husband',
+                                  self.character_map[family.father])
+
+        if family.mother in self.character_map:
+            record += self.member('WIFE', 'Wife',
+                                  self.character_map[family.mother])
+
+        for c in family.children:
+            record += self.member('CHIL', 'Child', self.character_map[c])
+
+        return ''.join(record)
+
+    def member(self, tag, description, character):
+        g = character.GEDCOM_id
+        if g == '':
+            return []
+        elif self.shard is None or self.shard_of[g] == self.shard:
+            return ['\n1 ', tag, ' @', g, '@']
+        else:
+            return self.elsewhere(description, g)
+
+    def elsewhere(self, description, xref):
+        # A record in another shard cannot be pointed to, so it is noted
+        # along with the file it is in instead
+        return ['\n1 NOTE ', description, ' @', xref, '@ is in ',
+                os.path.basename(self.shard_files[self.shard_of[xref]])]
+
+    def render_chunk(self, task):
+        record_type, keys = task
+        if record_type == 'INDI':
+            return [self.individual_record(g) for g in keys]
+        else:
+            return [self.family_record(f) for f in keys]
+
+    def task_xrefs(self, task):
+        record_type, keys = task
+        if record_type == 'INDI':
+            return keys
+        else:
+            return [self.family_map[f].id for f in keys]
+
+    @staticmethod
+    def fingerprint(record):
+        return hashlib.sha1(record.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def read_fingerprints(filename):
+        if not os.path.exists(filename):
+            return {}
+        with open(filename, encoding='utf-8') as file:
+            return json.load(file)
+
+    def write_fingerprints(self, filename):
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump(self.fingerprints, file, sort_keys=True)
+
+    def changed_records(self, xrefs, records, previous_fingerprints):
+        changed = []
+
+        for xref, record in zip(xrefs, records):
+            fingerprint = self.fingerprint(record)
+            self.fingerprints[xref] = fingerprint
+
+            if xref not in previous_fingerprints:
+                self.changes['new'] += 1
+            elif previous_fingerprints[xref] != fingerprint:
+                self.changes['changed'] += 1
+            else:
+                continue
+            changed.append(record)
+
+        return changed
+
+    def gedcom_chunks(self, filename, jobs=1, previous_fingerprints=None):
+        # Yields the file a chunk of records at a time, so that the caller
+        # only has to write large strings.  With previous_fingerprints, only
+        # records that are new or differ from the previous export are
+        # yielded, and the ones that are gone are listed in the header.
+        global shared_writer
+
+        if filename == STDOUT:
+            yield '0 HEAD'
+        elif filename.endswith('.gz') or filename.endswith('.xz'):
+            yield '0 HEAD\n1 FILE ' + filename[:-3]
+        else:
+            yield '0 HEAD\n1 FILE ' + filename
+        yield '\n1 GEDC\n2 VERS 5.5\n2 FORM LINEAGE-LINKED\n1 CHAR UTF-8'
+
+        if self.shard is None:
+            individuals = list(self.gedcom_map)
+            families = list(self.family_map)
+        else:
+            individuals = self.shard_individuals[self.shard]
+            families = self.shard_families[self.shard]
+            yield ('\n1 NOTE Part of a family tree split into several files;'
+                   ' records in other files are noted with their file')
+
+        if previous_fingerprints is not None:
+            current = set(self.gedcom_map)
+            current.update(self.family_map[f].id for f in self.family_map)
+            removed = sorted(x for x in previous_fingerprints
+                             if x not in current)
+
+            self.fingerprints = {}
+            self.changes = {'new': 0, 'changed': 0, 'removed': len(removed)}
+
+            yield ('\n1 NOTE Only records that are new or changed since the'
+                   ' previous export')
+            yield ''.join(['\n1 NOTE Removed @' + x + '@' for x in removed])
+
+        tasks = [('INDI', chunk) for chunk in
+                 chunks(individuals, RECORDS_PER_CHUNK)]
+        tasks += [('FAM', chunk) for chunk in
+                  chunks(families, RECORDS_PER_CHUNK)]
+        total_records = len(individuals) + len(families)
+        records_written = 0
+
+        # Workers need the character and title maps, which only forking
+        # shares cheaply, so without fork the records are rendered here
+        if (jobs > 1 and len(tasks) > 1
+            and 'fork' in multiprocessing.get_all_start_methods()):
+            shared_writer = self
+            pool = multiprocessing.get_context('fork').Pool(
+                min(jobs, len(tasks))
+            )
+            rendered = pool.imap(render_shared_chunk, tasks)
+        else:
+            pool = None
+            rendered = map(self.render_chunk, tasks)
+
+        try:
+            for task, records in zip(tasks, rendered):
+                if previous_fingerprints is not None:
+                    records = self.changed_records(self.task_xrefs(task),
+                                                   records,
+                                                   previous_fingerprints)
+                yield ''.join(records)
+                records_written += len(task[1])
+                # Split exports report their progress per file instead
+                if self.shard is None:
+                    progress.report(records_written, total_records,
+                                    'records')
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+                shared_writer = None
+
+        yield '\n0 TRLR'
+
+    @staticmethod
+    def open_output(filename):
+        if filename.endswith('.gz'):
+            return gzip.open(filename, 'wt', encoding='utf-8',
+                             compresslevel=6)
+        elif filename.endswith('.xz'):
+            return lzma.open(filename, 'wt', encoding='utf-8')
+        else:
+            return open(filename, 'w', encoding='utf-8',
+                        buffering=OUTPUT_BUFFER_SIZE)
+
+    def write_file(self, filename, jobs=1, previous_fingerprints=None):
+        if filename == STDOUT:
+            # sys.__stdout__ is used since sys.stdout may have been redirected
+            # to keep messages out of the GEDCOM data
+            file = io.TextIOWrapper(sys.__stdout__.buffer, encoding='utf-8')
+            try:
+                for text in self.gedcom_chunks(filename, jobs,
+                                               previous_fingerprints):
+                    file.write(text)
+            finally:
+                file.flush()
+                file.detach()
+        else:
+            with self.open_output(filename) as file:
+                for text in self.gedcom_chunks(filename, jobs,
+                                               previous_fingerprints):
+                    file.write(text)
+
+    @instrumented('write_gedcom')
+    def write_gedcom(self, filename, jobs=1, fingerprint_file=None):
         print('### Writing .ged file with {0} characters and {1} '
               'families...'.format(len(self.gedcom_map), len(self.family_map)), end='\n')
         sys.stdout.flush()
 
-        with open(filename, 'w', encoding='utf-8') as file:
-            file.write('0 HEAD\n1 FILE ' + filename + '\n1 GEDC\n2 VERS 5.5\n')
-            file.write('2 FORM LINEAGE-LINKED\n1 CHAR UTF-8')
-            
-            total_entries = len(self.gedcom_map) + len(self.family_map)
-            entries_per_increment = total_entries // 80 + 1
-            entries_until_progress = entries_per_increment
+        if fingerprint_file is not None:
+            previous_fingerprints = self.read_fingerprints(fingerprint_file)
+        else:
+            previous_fingerprints = None
+
+        self.write_file(filename, jobs, previous_fingerprints)
 
-            for g in self.gedcom_map:
-                line = ''
+        print('Done. ###')
 
-                character = self.character_map[self.gedcom_map[g]]
+        if fingerprint_file is not None:
+            self.write_fingerprints(fingerprint_file)
+            print('### {0} new, {1} changed and {2} removed records ###'
+                  .format(self.changes['new'], self.changes['changed'],
+                          self.changes['removed']))
 
-                if character.gender == 0:
-                    gender_string = 'F'
-                else:
-                    gender_string = 'M'
-
-                line += '\n0 @I' + str(g) + '@ INDI'
-                line += '\n1 NAME ' + character.birth_name + ' /'
-                line += character.dynasty_name.upper() + '/'
-                line += '\n2 GIVN ' + character.birth_name
-                line += '\n2 SURN ' + character.dynasty_name
-                line += '\n1 SEX ' + gender_string
-                line += '\n1 OCCU ' 
-                line += character.get_primary_title(self.title_map)
-
-                years_of_rule = character.get_years_of_rule(self.title_map)
-
-                for s in years_of_rule:
-                    line += '\n1 NOTE ' + s
-
-                line += '\n1 NOTE Game ID# ' + str(character.id)
-
-                if (settings.real_fathers 
-                    and character.real_father in self.character_map
-                    and character.father in self.character_map):
-                    line += '\n1 NOTE Presumed father is '
-                    line += self.character_map[character.father].birth_name
-                    line += ' '
-                    line += self.character_map[character.father].dynasty_name
-                    line += ' (' + str(character.father) + ')'
-
-                elif (settings.real_fathers 
-                      and character.real_father in self.character_map):
-                    line += '\n1 NOTE Father unknown'
-
-                elif (not settings.real_fathers
-                      and character.real_father in self.character_map):
-                    real_father = character.real_father
-                    line += '\n1 NOTE Real father is '
-                    line += self.character_map[real_father].birth_name + ' '
-                    line += self.character_map[real_father].dynasty_name + ' ('
-                    line += str(real_father) + ')'
-
-                if type(character.birthday) is Date:
-                    line += '\n1 BIRT\n2 DATE '
-                    line += character.birthday.gedcom_string()
-
-                if type(character.deathday) is Date:
-                    line += '\n1 DEAT\n2 DATE '
-                    line += character.deathday.gedcom_string()
-
-                for f in character.FAMS:
-                    line += '\n1 FAMS @F' + str(f) + '@'
-
-                if character.FAMC > 0:
-                    line += '\n1 FAMC @F' + str(character.FAMC) + '@'
-
-                file.write(line)
-                
-                entries_until_progress -= 1
-                if entries_until_progress == 0:
-                    print('=', end='')
-                    sys.stdout.flush()
-                    entries_until_progress = entries_per_increment
-
-            for f in self.family_map:
-                line = ''
-
-                family = self.family_map[f]
-
-                line += '\n0 @F' + str(family.id) + '@ FAM'
-
-                if family.father in self.character_map:
-                    character = self.character_map[family.father]
-                    if character.GEDCOM_id > 0:
-                        line += '\n1 HUSB @I' + str(character.GEDCOM_id) + '@'
-
-                if family.mother in self.character_map:
-                    character = self.character_map[family.mother]
-                    if character.GEDCOM_id > 0:
-                        line += '\n1 WIFE @I' + str(character.GEDCOM_id) + '@'
-
-                for c in family.children:
-                    character = self.character_map[c]
-                    if character.GEDCOM_id > 0:
-                        line += '\n1 CHIL @I' + str(character.GEDCOM_id) + '@'
-
-                file.write(line)
-                
-                entries_until_progress -= 1
-                if entries_until_progress == 0:
-                    print('=', end='')
-                    sys.stdout.flush()
-                    entries_until_progress = entries_per_increment
-
-            file.write('\n0 TRLR')
-            
-            file.close()
-
-        print('\nDone. ###')
+        sys.stdout.flush()
+
+    @staticmethod
+    def shard_filename(filename, name):
+        # mygame.ged.gz -> mygame.<name>.ged.gz
+        compression = ''
+        if filename.endswith('.gz') or filename.endswith('.xz'):
+            compression = filename[-3:]
+            filename = filename[:-3]
+        root, extension = os.path.splitext(filename)
+        return root + '.' + name + extension + compression
+
+    def dynasty_shards(self):
+        # Individuals go to the file of their dynasty
+        shards = {}
+
+        for g in self.gedcom_map:
+            dynasty_id = self.character_map[self.gedcom_map[g]].dynasty_id
+            if dynasty_id > 0:
+                shards[g] = 'dynasty' + str(dynasty_id)
+            else:
+                shards[g] = 'nodynasty'
+
+        self.family_shards(shards)
+        return shards
+
+    def family_shards(self, shards):
+        # Families go to the file of the first of the father, the mother and
+        # the children that is written
+        for f in self.family_map:
+            family = self.family_map[f]
+
+            for c in [family.father, family.mother] + family.children:
+                if c not in self.character_map:
+                    continue
+                g = self.character_map[c].GEDCOM_id
+                if g != '':
+                    shards[family.id] = shards[g]
+                    break
+
+    def component_shards(self):
+        # Individuals connected through families, directly or not, are in
+        # the same component and go to the same file, so no references cross
+        # files.  The largest tree is tree1.
+        shards = {}
+
+        for g in self.gedcom_map:
+            component = self.character_map[self.gedcom_map[g]].component
+            shards[g] = 'tree' + str(component)
+
+        self.family_shards(shards)
+        return shards
+
+    def generate_shards(self, filename, by):
+        if by == 'dynasty':
+            self.shard_of = self.dynasty_shards()
+        else:
+            self.shard_of = self.component_shards()
+
+        self.shard_individuals = defaultdict(list)
+        self.shard_families = defaultdict(list)
+
+        for g in self.gedcom_map:
+            self.shard_individuals[self.shard_of[g]].append(g)
+        for f in self.family_map:
+            self.shard_families[self.shard_of[self.family_map[f].id]].append(f)
+
+        self.shard_files = {}
+        for name in self.shard_individuals:
+            self.shard_files[name] = self.shard_filename(filename, name)
+
+    def write_shard(self, shard):
+        self.shard = shard
+        try:
+            self.write_file(self.shard_files[shard])
+        finally:
+            self.shard = None
+        return shard
+
+    @instrumented('write_gedcom')
+    def write_shards(self, filename, by, jobs=1):
+        global shared_writer
+
+        self.generate_shards(filename, by)
+        shards = sorted(self.shard_files)
+
+        print('### Writing {0} .ged files with {1} characters and {2} '
+              'families...'.format(len(shards), len(self.gedcom_map),
+                                   len(self.family_map)))
+        sys.stdout.flush()
+
+        # Each process writes whole files, which only forking makes cheap
+        # for the same reason as in gedcom_chunks
+        if (jobs > 1 and len(shards) > 1
+            and 'fork' in multiprocessing.get_all_start_methods()):
+            shared_writer = self
+            pool = multiprocessing.get_context('fork').Pool(
+                min(jobs, len(shards))
+            )
+            written = pool.imap_unordered(write_shared_shard, shards)
+        else:
+            pool = None
+            written = map(self.write_shard, shards)
+
+        try:
+            for i, shard in enumerate(written):
+                progress.report(i + 1, len(shards), 'files')
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+                shared_writer = None
+
+        recorder.count('gedcom_files', len(shards))
+
+        print('Done. ###')
         sys.stdout.flush()
@@ -0,0 +1,190 @@
+import cProfile
+import json
+import os
+import os.path
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+class Recorder(object):
+    """Records the time and memory used by each phase of a run.
+
+    Recording is off by default, in which case instrumented functions only
+    pay for a single attribute check per call.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.phases = []
+        self.counts = OrderedDict()
+        self.maximums = OrderedDict()
+
+    def enable(self, trace_memory=True):
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        self.phases = []
+        self.counts = OrderedDict()
+        self.maximums = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        if self.trace_memory and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        try:
+            yield
+        finally:
+            record = OrderedDict()
+            record['name'] = name
+            record['wall_time'] = time.perf_counter() - wall_start
+            record['cpu_time'] = time.process_time() - cpu_start
+            if self.trace_memory:
+                record['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            else:
+                record['peak_memory'] = None
+            self.phases.append(record)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def maximum(self, name, value):
+        # Unlike counts, these are not added up over several saves
+        if self.enabled:
+            self.maximums[name] = max(self.maximums.get(name, value), value)
+
+    def counted(self, iterable, name):
+        if not self.enabled:
+            return iterable
+        return self.count_items(iterable, name)
+
+    def count_items(self, iterable, name):
+        number = 0
+        try:
+            for item in iterable:
+                number += 1
+                yield item
+        finally:
+            self.count(name, number)
+
+    def merge(self, phases, counts, maximums):
+        self.phases += phases
+        for name in counts:
+            self.count(name, counts[name])
+        for name in maximums:
+            self.maximum(name, maximums[name])
+
+    def report(self):
+        totals = OrderedDict()
+        for record in self.phases:
+            if record['name'] not in totals:
+                totals[record['name']] = OrderedDict(
+                    [('calls', 0), ('wall_time', 0.0), ('cpu_time', 0.0),
+                     ('peak_memory', record['peak_memory'])]
+                )
+            total = totals[record['name']]
+            total['calls'] += 1
+            total['wall_time'] += record['wall_time']
+            total['cpu_time'] += record['cpu_time']
+            if record['peak_memory'] is not None:
+                total['peak_memory'] = max(total['peak_memory'],
+                                           record['peak_memory'])
+
+        report = OrderedDict()
+        report['python'] = platform.python_version()
+        report['platform'] = platform.platform()
+        report['command'] = sys.argv
+        report['phases'] = self.phases
+        report['totals'] = totals
+        report['counts'] = self.counts
+        report['maximums'] = self.maximums
+        return report
+
+    def write_report(self, filename):
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+            file.write('\n')
+
+class Profiler(object):
+    """Runs each phase under cProfile and dumps one .pstats file per phase.
+
+    Phases must not be nested, since only one profiler can be active at a
+    time.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.directory = ''
+        self.profiles = OrderedDict()
+
+    def enable(self, directory):
+        self.enabled = True
+        self.directory = directory
+
+    def reset(self):
+        self.profiles = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        if name not in self.profiles:
+            self.profiles[name] = cProfile.Profile()
+        profile = self.profiles[name]
+
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def dump(self, directory=None, top=0):
+        if directory is None:
+            directory = self.directory
+        if len(self.profiles) == 0:
+            return
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        for name in self.profiles:
+            self.profiles[name].dump_stats(
+                os.path.join(directory, name + '.pstats')
+            )
+
+        if top > 0:
+            with open(os.path.join(directory, 'summary.txt'), 'w') as file:
+                for stream in [file, sys.stdout]:
+                    stats = pstats.Stats(*self.profiles.values(),
+                                         stream=stream)
+                    stats.sort_stats('tottime').print_stats(top)
+
+recorder = Recorder()
+profiler = Profiler()
+
+def instrumented(name):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled and not profiler.enabled:
+                return function(*args, **kwargs)
+            with recorder.phase(name), profiler.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,53 @@
+import sys
+
+# Long loops report their progress once per chunk rather than once per item,
+# so that having no callback costs nothing on the hot path
+CHARACTERS_PER_CHUNK = 65536
+RECORDS_PER_CHUNK = 1024
+
+class Progress(object):
+    """Passes progress reports on to a callback, or drops them if there is
+    none, which is the default.
+
+    The callback is called as callback(done, total, unit), where unit is
+    'characters' while parsing, 'records' while writing a GEDCOM file,
+    'files' while writing a GEDCOM file split into several, and 'tables'
+    while writing databases.
+    """
+    def __init__(self):
+        self.callback = None
+
+    def set_callback(self, callback):
+        self.callback = callback
+
+    def report(self, done, total, unit):
+        if self.callback is not None:
+            self.callback(done, total, unit)
+
+class ProgressBar(object):
+    """Draws a bar of '=' characters on the console, ending the line once a
+    step is done."""
+    def __init__(self, width=80, stream=None):
+        self.width = width
+        self.stream = stream
+        self.drawn = 0
+
+    def __call__(self, done, total, unit):
+        stream = self.stream if self.stream is not None else sys.stdout
+        length = self.width * done // total if total > 0 else self.width
+
+        if length > self.drawn:
+            stream.write('=' * (length - self.drawn))
+            self.drawn = length
+
+        if done >= total:
+            stream.write('\n')
+            self.drawn = 0
+
+        stream.flush()
+
+def chunks(sequence, size):
+    for start in range(0, len(sequence), size):
+        yield sequence[start:start + size]
+
+progress = Progress()
@@ -0,0 +1,121 @@
+from bisect import bisect_left
+from heapq import merge
+
+def merge_postings(posting_lists):
+    result = []
+    for x in merge(*posting_lists):
+        if len(result) == 0 or result[-1] != x:
+            result.append(x)
+    return result
+
+def intersect_postings(first, second):
+    if len(first) > len(second):
+        first, second = second, first
+
+    result = []
+    lo = 0
+    for x in first:
+        lo = bisect_left(second, x, lo)
+        if lo == len(second):
+            break
+        if second[lo] == x:
+            result.append(x)
+    return result
+
+class TrieNode(object):
+    __slots__ = ['children', 'postings']
+
+    def __init__(self):
+        self.children = {}
+        self.postings = []
+
+class SearchTrie(object):
+    """Character-level index mapping search terms to sorted posting lists.
+
+    Postings must be added in increasing order, so that every lookup returns
+    a sorted list without needing to sort it.
+    """
+    max_distance = 2
+
+    def __init__(self):
+        self.root = TrieNode()
+
+    def add(self, term, posting):
+        node = self.root
+        for c in term:
+            if c not in node.children:
+                node.children[c] = TrieNode()
+            node = node.children[c]
+        if len(node.postings) == 0 or node.postings[-1] != posting:
+            node.postings.append(posting)
+
+    def find_node(self, term):
+        node = self.root
+        for c in term:
+            if c not in node.children:
+                return None
+            node = node.children[c]
+        return node
+
+    def exact(self, term):
+        node = self.find_node(term)
+        if node is None:
+            return []
+        return list(node.postings)
+
+    def prefix(self, term):
+        node = self.find_node(term)
+        if node is None:
+            return []
+
+        posting_lists = []
+        stack = [node]
+        while len(stack) > 0:
+            node = stack.pop()
+            if len(node.postings) > 0:
+                posting_lists.append(node.postings)
+            stack.extend(node.children.values())
+
+        return merge_postings(posting_lists)
+
+    def fuzzy(self, term, max_distance):
+        # Levenshtein distance computed one trie level at a time, so that
+        # whole subtrees are skipped once every entry of the row is too big
+        if max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        posting_lists = []
+        first_row = list(range(len(term) + 1))
+        stack = [(child, c, first_row)
+                 for c, child in self.root.children.items()]
+
+        while len(stack) > 0:
+            node, c, previous_row = stack.pop()
+            row = [previous_row[0] + 1]
+
+            for i in range(1, len(term) + 1):
+                cost = 0 if term[i-1] == c else 1
+                row.append(min(row[i-1] + 1, previous_row[i] + 1,
+                               previous_row[i-1] + cost))
+
+            if row[-1] <= max_distance and len(node.postings) > 0:
+                posting_lists.append(node.postings)
+
+            if min(row) <= max_distance:
+                stack.extend((child, next_c, row)
+                             for next_c, child in node.children.items())
+
+        return merge_postings(posting_lists)
+
+    def lookup(self, token):
+        if token.endswith('*'):
+            return self.prefix(token[:-1])
+
+        if '~' in token:
+            term, distance = token.rsplit('~', 1)
+            if distance == '':
+                return self.fuzzy(term, 1)
+            if distance.isdigit():
+                return self.fuzzy(term, int(distance))
+
+        return self.exact(token)
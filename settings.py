@@ -12,6 +12,16 @@ cull_loners = True
 cull_childless_spouses = False
 # Use real fathers (as opposed to presumed fathers?
 real_fathers = False
+# How many generations of ancestors and descendants of your dynasty members
+# to include in modes 2, 3 and 4 (-1 for all of them)?  None uses the mode's
+# own: parents, and all, one or no generations of descendants.  The last
+# generation of descendants is included without their spouses and parents.
+ancestor_generations = None
+descendant_generations = None
+# Include the spouses of your dynasty members and their descendants?
+include_spouses = True
+# How many characters to include at most in mode 5?
+max_characters = 10000
 # Generate primary title in "occupation" field and years of rule in "notes"
 # field?
 generate_titles = True
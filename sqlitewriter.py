@@ -0,0 +1,86 @@
+import sys
+import os
+import os.path
+import sqlite3
+
+from instrumentation import recorder, instrumented
+from progress import progress
+from tablerows import TableRows, tables, batches, ROWS_PER_BATCH
+
+# Indexes are created after loading, which is faster than keeping them up to
+# date row by row
+indexes = [
+    ('characters', ['father']),
+    ('characters', ['real_father']),
+    ('characters', ['mother']),
+    ('characters', ['dynasty_id']),
+    ('characters', ['birth']),
+    ('characters', ['death']),
+    ('spouses', ['character_id']),
+    ('spouses', ['spouse_id']),
+    ('title_ownerships', ['character_id']),
+    ('title_ownerships', ['title_id', 'start']),
+    ('title_ownerships', ['start', 'end']),
+    ('families', ['father']),
+    ('families', ['mother']),
+    ('family_children', ['family_id']),
+    ('family_children', ['child_id']),
+]
+
+class SqliteWriter(TableRows):
+    def __init__(self):
+        self.row_counts = {}
+
+    def load_table(self, cursor, table, columns):
+        cursor.execute('CREATE TABLE ' + table + ' (' + ', '.join(columns)
+                       + ')')
+        insert = ('INSERT INTO ' + table + ' VALUES ('
+                  + ', '.join(['?'] * len(columns)) + ')')
+        count = 0
+
+        for batch in batches(self.table_rows(table), ROWS_PER_BATCH):
+            cursor.executemany(insert, batch)
+            count += len(batch)
+
+        self.row_counts[table] = count
+
+    @instrumented('write_sqlite')
+    def write_sqlite(self, filename):
+        print('### Writing SQLite database with {0} characters...'.format(
+            len(self.character_map)))
+        sys.stdout.flush()
+
+        # The database is always written from scratch
+        if os.path.exists(filename):
+            os.remove(filename)
+
+        # With isolation_level None the transaction is controlled here, so
+        # that everything is loaded in a single one
+        connection = sqlite3.connect(filename, isolation_level=None)
+        steps = len(tables) + 1
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute('PRAGMA journal_mode = OFF')
+            cursor.execute('PRAGMA synchronous = OFF')
+            cursor.execute('BEGIN')
+
+            for i, (table, columns) in enumerate(tables):
+                self.load_table(cursor, table, columns)
+                progress.report(i + 1, steps, 'tables')
+
+            for table, columns in indexes:
+                cursor.execute('CREATE INDEX ' + table + '_'
+                               + '_'.join(columns) + ' ON ' + table + ' ('
+                               + ', '.join(columns) + ')')
+            progress.report(steps, steps, 'tables')
+
+            cursor.execute('COMMIT')
+        finally:
+            connection.close()
+
+        for table in self.row_counts:
+            recorder.count('sqlite_' + table, self.row_counts[table])
+
+        print('Done. ###')
+        sys.stdout.flush()
@@ -0,0 +1,143 @@
+from itertools import islice
+
+from datatypes import Date
+
+# Rows are written this many at a time, so that no table has to be built as
+# one big list first
+ROWS_PER_BATCH = 10000
+
+# Table name and column definitions, in the order the tables are written
+tables = [
+    ('dynasties', ['id INTEGER PRIMARY KEY', 'name TEXT', 'culture TEXT',
+                   'religion TEXT']),
+    ('characters', ['id INTEGER PRIMARY KEY', 'birth_name TEXT',
+                    'regnal_name TEXT', 'nickname TEXT', 'gender INTEGER',
+                    'birth TEXT', 'death TEXT', 'culture TEXT',
+                    'religion TEXT', 'father INTEGER', 'real_father INTEGER',
+                    'mother INTEGER', 'dynasty_id INTEGER',
+                    'dynasty_name TEXT', 'government TEXT',
+                    'primary_title TEXT', 'marked INTEGER',
+                    'gedcom_id TEXT']),
+    ('spouses', ['character_id INTEGER', 'spouse_id INTEGER']),
+    ('titles', ['id TEXT PRIMARY KEY', 'name TEXT', 'rank INTEGER']),
+    ('title_ownerships', ['character_id INTEGER', 'title_id TEXT',
+                          'start TEXT', 'end TEXT', 'gain_type TEXT',
+                          'from_whom INTEGER', 'lose_type TEXT',
+                          'to_whom INTEGER', 'current_owner INTEGER',
+                          'exclude_from_history INTEGER']),
+    ('families', ['id TEXT PRIMARY KEY', 'father INTEGER', 'mother INTEGER']),
+    ('family_children', ['family_id TEXT', 'child_id INTEGER']),
+]
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+class TableRows(object):
+    """Produces the rows of each exported table from the in-memory model,
+    one at a time, for the database and flat file writers."""
+    def initialize(self, game_data, family_map):
+        self.character_map = game_data.character_map
+        self.dynasty_map = game_data.dynasty_map
+        self.title_map = game_data.title_map
+        self.family_map = family_map
+
+    @staticmethod
+    def date_string(date):
+        # ISO dates sort and compare correctly as text
+        if type(date) is not Date or date.is_null():
+            return None
+        return '{:04d}-{:02d}-{:02d}'.format(date.year, date.month, date.day)
+
+    @staticmethod
+    def character_id(c):
+        if c == -1:
+            return None
+        return c
+
+    def dynasty_rows(self):
+        for d in self.dynasty_map:
+            dynasty = self.dynasty_map[d]
+            yield (d, dynasty.name, dynasty.culture, dynasty.religion)
+
+    def character_rows(self):
+        for c in self.character_map:
+            character = self.character_map[c]
+
+            if character.culture is not None:
+                culture = character.culture.id
+            else:
+                culture = None
+
+            if character.religion is not None:
+                religion = character.religion.id
+            else:
+                religion = None
+
+            if character.GEDCOM_id != '':
+                gedcom_id = character.GEDCOM_id
+            else:
+                gedcom_id = None
+
+            yield (c, character.birth_name, character.regnal_name,
+                   character.nickname, character.gender,
+                   self.date_string(character.birthday),
+                   self.date_string(character.deathday), culture, religion,
+                   self.character_id(character.father),
+                   self.character_id(character.real_father),
+                   self.character_id(character.mother),
+                   self.character_id(character.dynasty_id),
+                   character.dynasty_name, character.government,
+                   character.title_history.primary or None,
+                   int(character.mark), gedcom_id)
+
+    def spouse_rows(self):
+        for c in self.character_map:
+            for s in self.character_map[c].spouse:
+                yield (c, s)
+
+    def title_rows(self):
+        for t in self.title_map:
+            title = self.title_map[t]
+            yield (t, title.name, title.rank)
+
+    def title_ownership_rows(self):
+        for c in self.character_map:
+            titles = self.character_map[c].title_history.titles
+
+            for t in titles:
+                for ownership in titles[t]:
+                    r = ownership.held_range
+                    yield (c, t, self.date_string(r.start),
+                           self.date_string(r.end), ownership.gain_type,
+                           ownership.from_whom or None,
+                           ownership.lose_type, ownership.to_whom or None,
+                           int(ownership.current_owner),
+                           int(ownership.exclude_from_history))
+
+    def family_rows(self):
+        for f in self.family_map:
+            family = self.family_map[f]
+            yield (family.id, self.character_id(family.father),
+                   self.character_id(family.mother))
+
+    def family_children_rows(self):
+        for f in self.family_map:
+            family = self.family_map[f]
+            for c in family.children:
+                yield (family.id, c)
+
+    def table_rows(self, table):
+        return {
+            'dynasties': self.dynasty_rows,
+            'characters': self.character_rows,
+            'spouses': self.spouse_rows,
+            'titles': self.title_rows,
+            'title_ownerships': self.title_ownership_rows,
+            'families': self.family_rows,
+            'family_children': self.family_children_rows,
+        }[table]()
@@ -0,0 +1,56 @@
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+from synthetic import SyntheticGame
+
+class NoInputTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='ck2ged_test_')
+        game = SyntheticGame(characters=200, dynasties=10, titles=50, mods=1)
+        self.install_dir, self.mod_dir, mods, self.save = game.write(
+            self.directory
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_no_input_without_mods_does_not_prompt(self):
+        # With stdin closed, a prompt would read an empty line and carry on,
+        # so the output is checked for the prompt as well
+        output = os.path.join(self.directory, 'tree.ged')
+        result = subprocess.run(
+            [sys.executable, os.path.join(root, 'ck2_ged.py'), self.save,
+             '--install-dir', self.install_dir, '--mod-dir', self.mod_dir,
+             '--mode', '3', '--no-input', '-o', output],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, universal_newlines=True, timeout=120
+        )
+
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertNotIn('Please specify which mods', result.stdout)
+        self.assertTrue(os.path.exists(output))
+
+    def test_title_history_no_input(self):
+        # The browser reads commands until it is told to quit
+        result = subprocess.run(
+            [sys.executable, os.path.join(root, 'ck2_title_history.py'),
+             self.save, '--install-dir', self.install_dir, '--mod-dir',
+             self.mod_dir, '--no-input'],
+            input='quit\n', stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, universal_newlines=True, timeout=120
+        )
+
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertNotIn('Please specify which mods', result.stdout)
+        self.assertNotIn('Traceback', result.stdout)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+import io
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+import settings
+from datatypes import Character
+from familyindex import FamilyIndex
+from gamedata import GameData
+from synthetic import SyntheticGame
+
+def character(id, father=-1, mother=-1, real_father=None, spouse=()):
+    c = Character()
+    c.id = id
+    c.father = father
+    c.mother = mother
+    c.real_father = father if real_father is None else real_father
+    c.spouse = list(spouse)
+    return c
+
+def family():
+    #  6 + 7     1 + 2
+    #    |         |
+    #    5  +  3   4 + 13
+    #        |
+    #   10 + 8      12      14
+    #        |
+    #        9
+    #        |
+    #       11
+    #
+    # 13 is only listed as 4's spouse on 13's side, and 14 is 8's real
+    # father
+    characters = [
+        character(1, spouse=[2]),
+        character(2),
+        character(3, 1, 2, spouse=[5]),
+        character(4, 1, 2),
+        character(5, 6, 7),
+        character(6),
+        character(7),
+        character(8, 3, 5, real_father=14, spouse=[10]),
+        character(9, 8, 10),
+        character(10),
+        character(11, 9),
+        character(12),
+        character(13, spouse=[4]),
+        character(14),
+    ]
+    return dict((c.id, c) for c in characters)
+
+class FamilyIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.character_map = family()
+        self.index = FamilyIndex(self.character_map)
+
+    def test_spouses_are_symmetric(self):
+        self.assertEqual(self.index.spouses[4], [13])
+        self.assertEqual(self.index.spouses[13], [4])
+        self.assertEqual(self.index.spouses[2], [1])
+
+    def test_father(self):
+        c = self.character_map[8]
+        self.assertEqual(self.index.father(c, False), 3)
+        self.assertEqual(self.index.father(c, True), 14)
+        c = self.character_map[9]
+        self.assertEqual(self.index.father(c, True), 8)
+
+    def test_related_descendant_depth(self):
+        related = self.index.related
+        self.assertEqual(related([3], 1, 0), {1, 2, 3, 5})
+        # The last generation is marked, but not its spouses
+        self.assertEqual(related([3], 1, 1), {1, 2, 3, 5, 8})
+        self.assertEqual(related([3], 1, 2), {1, 2, 3, 5, 8, 9, 10})
+        self.assertEqual(related([3], 1, -1), {1, 2, 3, 5, 8, 9, 10, 11})
+
+    def test_related_ancestor_depth(self):
+        related = self.index.related
+        self.assertEqual(related([9], 0, 0), {9})
+        self.assertEqual(related([9], 1, 0), {8, 9, 10})
+        self.assertEqual(related([8], 1, 0), {3, 5, 8, 10})
+        self.assertEqual(related([8], 2, 0), {1, 2, 3, 5, 6, 7, 8, 10})
+        self.assertEqual(related([11], -1, 0), {1, 2, 3, 5, 6, 7, 8, 9, 10,
+                                                11})
+
+    def test_related_without_spouses(self):
+        related = self.index.related
+        self.assertEqual(related([8], 1, 0, spouses=False), {3, 5, 8})
+        self.assertEqual(related([4], 0, 0, spouses=False), {4})
+        self.assertEqual(related([13], 0, 0), {4, 13})
+
+    def test_related_real_fathers(self):
+        related = self.index.related
+        self.assertEqual(related([14], 0, 1), {14})
+        self.assertEqual(related([14], 0, 1, real_fathers=True), {8, 14})
+        self.assertEqual(related([8], 1, 0, False, True), {5, 8, 14})
+
+    def test_closest_budget(self):
+        closest = self.index.closest
+        self.assertEqual(closest([3], 1), {3})
+        self.assertEqual(len(closest([3], 5)), 5)
+        self.assertEqual(closest([3], 100), set(range(1, 12)) | {13})
+        self.assertEqual(closest([3], 100, spouses=False),
+                         set(range(1, 12)))
+        self.assertEqual(closest([12], 100), {12})
+
+    def test_closest_distance_order(self):
+        closest = self.index.closest
+        # Parents and children first, then, at the same distance and in the
+        # order they were found, the spouse, the sibling and the grandchild
+        self.assertEqual(closest([3], 4), {1, 2, 3, 8})
+        self.assertEqual(closest([3], 5), {1, 2, 3, 5, 8})
+        self.assertEqual(closest([3], 6), {1, 2, 3, 4, 5, 8})
+        self.assertEqual(closest([3], 7), {1, 2, 3, 4, 5, 8, 9})
+        self.assertEqual(closest([3], 6, spouses=False), {1, 2, 3, 4, 5, 8})
+        self.assertEqual(closest([3, 12], 2), {3, 12})
+
+    def test_components(self):
+        members = sorted(self.character_map)
+        labels, sizes = self.index.components(members)
+        self.assertEqual(sizes, [12, 1, 1])
+        self.assertEqual(set(labels[c] for c in range(1, 12)), {1})
+        self.assertEqual(labels[13], 1)
+        self.assertEqual(labels[12], 2)
+        self.assertEqual(labels[14], 3)
+
+    def test_components_without_spouses(self):
+        members = sorted(self.character_map)
+        labels, sizes = self.index.components(members, spouses=False)
+        self.assertEqual(sizes, [11, 1, 1, 1])
+        self.assertEqual([labels[c] for c in [12, 13, 14]], [2, 3, 4])
+
+        labels, sizes = self.index.components(members, real_fathers=True)
+        self.assertEqual(sizes, [13, 1])
+        self.assertEqual(labels[14], 1)
+        self.assertEqual(labels[12], 2)
+
+    def test_components_of_some_members(self):
+        labels, sizes = self.index.components([12, 4, 13, 1])
+        self.assertEqual(sizes, [3, 1])
+        self.assertEqual(labels, {1: 1, 4: 1, 13: 1, 12: 2})
+
+        # Members of the same size are numbered in the given order
+        labels, sizes = self.index.components([14, 12, 6], spouses=False)
+        self.assertEqual(sizes, [1, 1, 1])
+        self.assertEqual(labels, {14: 1, 12: 2, 6: 3})
+
+        # Relatives that are not members do not connect them
+        labels, sizes = self.index.components([3, 9])
+        self.assertEqual(sizes, [1, 1])
+
+# Characters marked in modes 2 to 5 of the synthetic game below, by presumed
+# father.  With real fathers, 1484 is also marked, and takes the place of
+# 1818 in mode 5.
+MARKED = {
+    2: [50, 1119, 1145, 1268, 1295, 1305, 1318, 1330, 1362, 1378, 1420, 1424,
+        1441, 1446, 1467, 1503, 1544, 1569, 1575, 1608, 1611, 1621, 1623, 1628,
+        1632, 1644, 1648, 1662, 1672, 1705, 1719, 1731, 1736, 1742, 1745, 1757,
+        1762, 1768, 1771, 1774, 1788, 1790, 1802, 1808, 1818, 1819, 1821, 1826,
+        1832, 1837, 1843, 1857, 1860, 1862, 1876, 1881, 1888, 1890, 1892, 1902,
+        1911, 1912, 1930, 1940, 1955, 1959, 1971, 1972, 1974, 1989, 1992,
+        1994],
+    3: [50, 1119, 1145, 1268, 1295, 1305, 1318, 1330, 1362, 1378, 1420, 1424,
+        1441, 1446, 1467, 1544, 1569, 1575, 1608, 1611, 1621, 1623, 1628, 1644,
+        1648, 1672, 1705, 1719, 1731, 1745, 1771, 1774, 1790, 1802, 1808, 1818,
+        1819, 1821, 1826, 1832, 1837, 1860, 1862, 1890, 1892, 1911, 1959, 1971,
+        1994],
+    4: [50, 1119, 1145, 1268, 1295, 1305, 1318, 1330, 1362, 1378, 1420, 1424,
+        1441, 1446, 1544, 1569, 1575, 1608, 1611, 1621, 1623, 1628, 1644, 1648,
+        1672, 1705, 1719, 1731, 1771, 1774, 1790, 1808, 1821, 1832, 1860, 1890,
+        1892, 1911, 1959, 1971, 1994],
+    5: [50, 1119, 1145, 1268, 1295, 1305, 1318, 1330, 1362, 1420, 1424, 1441,
+        1446, 1467, 1544, 1569, 1608, 1621, 1623, 1628, 1672, 1719, 1731, 1745,
+        1771, 1774, 1790, 1802, 1818, 1819, 1821, 1826, 1832, 1860, 1890, 1892,
+        1911, 1959, 1971, 1994],
+}
+
+class MarkingTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix='ck2ged_test_')
+        game = SyntheticGame(characters=2000, seed=0)
+        install_dir, mod_dir, mods, cls.save = game.write(cls.directory)
+
+        settings.debug = False
+        cls.game_data = GameData()
+        with redirect_stdout(io.StringIO()):
+            cls.game_data.initialize(install_dir, mod_dir, [])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        self.max_characters = settings.max_characters
+        settings.max_characters = 40
+
+    def tearDown(self):
+        settings.max_characters = self.max_characters
+
+    def marked(self, real_fathers, mode):
+        game_data = self.game_data.copy_for_save()
+        with redirect_stdout(io.StringIO()):
+            game_data.read_save(self.save, True)
+            self.assertTrue(game_data.mark_characters(real_fathers, mode))
+        character_map = game_data.character_map
+        return (set(c for c in character_map if character_map[c].mark),
+                set(character_map))
+
+    def test_marked_characters(self):
+        for real_fathers in [False, True]:
+            marked, everyone = self.marked(real_fathers, 1)
+            self.assertEqual(len(everyone), 2000)
+            self.assertEqual(marked, everyone)
+
+            for mode in [2, 3, 4, 5]:
+                expected = set(MARKED[mode])
+                if real_fathers:
+                    expected = (expected - {1818} if mode == 5
+                                else expected) | {1484}
+                marked, everyone = self.marked(real_fathers, mode)
+                self.assertEqual(marked, expected, (real_fathers, mode))
+
+if __name__ == '__main__':
+    unittest.main()
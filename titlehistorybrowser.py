@@ -1,21 +1,65 @@
 import sys
 import re
-from datatypes import Date
+from bisect import bisect_left
+from datatypes import *
+from searchindex import SearchTrie, intersect_postings
+from titleindex import TitleIndex
+from instrumentation import instrumented
 
 class TitleHistoryBrowser(object):
     date_regex = re.compile(r'\d{3,4}\.\d{2}\.\d{2}')
+    rank_words = {'emperor': EMPEROR, 'empire': EMPEROR, 'e': EMPEROR,
+                  'king': KING, 'kingdom': KING, 'k': KING,
+                  'duke': DUKE, 'duchy': DUKE, 'd': DUKE,
+                  'count': COUNT, 'county': COUNT, 'c': COUNT,
+                  'baron': BARON, 'barony': BARON, 'b': BARON}
 
     def __init__(self, game_data):
         character_map = game_data.character_map
         self.character_map = {c: character_map[c] for c in character_map
             if len(character_map[c].title_history.titles) > 0}
         self.title_map = game_data.title_map
+        self.title_index = game_data.title_index
         self.current_query = ''
         self.current_loc = 0
         self.current_results = []
+        self.current_ordinals = []
         self.cultural_titles = False
         self.show_tags = False
 
+        # Every titled character gets an ordinal by order of birth, so that
+        # search results and date jumps can work on sorted integer arrays
+        self.birth_order = sorted(
+            self.character_map,
+            key=lambda x: TitleIndex.date_key(self.character_map[x].birthday)
+        )
+        self.birth_keys = [TitleIndex.date_key(self.character_map[c].birthday)
+                           for c in self.birth_order]
+        self.search_index = self.build_search_index(self.character_map,
+                                                    self.birth_order)
+
+    @staticmethod
+    @instrumented('build_search_index')
+    def build_search_index(character_map, birth_order):
+        search_index = SearchTrie()
+
+        for ordinal, c in enumerate(birth_order):
+            character = character_map[c]
+            title_history = character.title_history
+            titles = [t for t in title_history.titles
+                      if len([o for o in title_history.titles[t]
+                              if not o.exclude_from_history]) > 0]
+            if len(titles) == 0:
+                continue
+
+            searchable = [character.birth_name, character.regnal_name,
+                          character.dynasty_name]
+            searchable += titles
+            for s in set([Character.asciify(s.lower()) for s in searchable]):
+                search_index.add(s, ordinal)
+
+        return search_index
+
     @staticmethod
     def show_help():
         print('The tool recognizes the following commands:\n'
@@ -46,6 +90,13 @@ class TitleHistoryBrowser(object):
               '<return>: Simply hitting return displays the search results at\n'
               '    the current position, if you were, say, previously looking\n'
               '    at a title history.\n'
+              '\n'
+              'Realm snapshots:\n'
+              '"snapshot <(Y)YYY.MM.DD> [<rank>]": Lists who held every title\n'
+              '    on that date.  The rank can be one of "emperor", "king",\n'
+              '    "duke", "count" or "baron" to only list titles of that rank.\n'
+              '"title <title id>": Lists every holder of a title, e.g.\n'
+              '    "title k_france", in the order they held it.\n'
               '\n(Press enter to continue)')
         sys.stdout.flush()
         sys.stdin.readline()
@@ -63,6 +114,11 @@ class TitleHistoryBrowser(object):
               'held one title at one time and the other title at a different\n'
               'time.\n'
               '\n'
+              'A search term ending in * matches every name or title id that\n'
+              'begins with it, e.g. "byz*".  A search term ending in ~ also\n'
+              'matches names and title ids that are one typo away, e.g.\n'
+              '"byzantum~"; end it with ~2 instead to allow up to two typos.\n'
+              '\n'
               'The list of search results will be sorted in other of birth\n'
               'date.  In addition to the "next" and "back" commands that you\n'
               'can use to browse it, you can also type a date in form of\n'
@@ -84,6 +140,10 @@ class TitleHistoryBrowser(object):
         lines = character.get_title_history(self.character_map, self.title_map,
                                             self.cultural_titles,
                                             self.show_tags)
+        self.show_lines(lines)
+
+    @staticmethod
+    def show_lines(lines):
         while len(lines) > 20:
             line_index = 20
             while line_index >= 0 and lines[line_index].startswith('    '):
@@ -139,11 +199,93 @@ class TitleHistoryBrowser(object):
         sys.stdout.flush()
 
 
+    def title_text(self, title, character):
+        if (self.cultural_titles and character.culture is not None
+            and character.culture.id in title.cultural_names):
+            text = title.cultural_names[character.culture.id]
+        else:
+            text = title.name
+        if self.show_tags:
+            text += ' [' + title.id + ']'
+        return text
+
+    def show_snapshot(self, date, rank):
+        lines = []
+
+        for title_id, holder, ownership in self.title_index.holders_at(date,
+                                                                       rank):
+            character = self.character_map[holder]
+            text = self.title_text(self.title_map[title_id], character) + ': '
+            text += character.get_primary_title(self.title_map, True)
+            text += ' [' + str(holder) + ']'
+            while len(text) > 76:
+                loc = text.rfind(' ', 0, 76)
+                lines.append(text[:loc])
+                text = '    ' + text[loc+1:]
+            lines.append(text)
+
+        if len(lines) == 0:
+            print('No titles were held on ' + str(date) + '.')
+            return
+
+        print('Titles held on ' + str(date) + ':\n')
+        self.show_lines(lines)
+
+    def show_succession(self, title_id):
+        succession = self.title_index.succession(title_id)
+
+        if len(succession) == 0:
+            print('No holders found for title "' + title_id + '".')
+            return
+
+        title = self.title_map[title_id]
+        lines = []
+
+        for tenure in succession:
+            character = self.character_map[tenure.holder]
+            held_range = tenure.held_range
+            text = str(held_range.start) + ' - '
+            text += 'present' if tenure.current_owner else str(held_range.end)
+            text += ': ' + character.get_primary_title(self.title_map, True)
+            text += ' [' + str(tenure.holder) + '], who '
+
+            if tenure.from_whom in self.character_map:
+                other = self.character_map[tenure.from_whom]
+            else:
+                other = Character()
+            text += character.title_history.format_lose_gain_text(
+                True, tenure.gain_type, other, [title], self.cultural_titles,
+                self.show_tags
+            )
+
+            while len(text) > 76:
+                loc = text.rfind(' ', 0, 76)
+                lines.append(text[:loc])
+                text = '    ' + text[loc+1:]
+            lines.append(text)
+
+        print('Holders of ' + self.title_text(title, Character()) + ':\n')
+        self.show_lines(lines)
+
     def skip_to_date(self, date):
-        for i, c_id in enumerate(self.current_results):
-            if self.character_map[c_id].birthday >= date:
-                self.current_loc = i
-                return
+        ordinal = bisect_left(self.birth_keys, TitleIndex.date_key(date))
+        loc = bisect_left(self.current_ordinals, ordinal)
+        if loc < len(self.current_ordinals):
+            self.current_loc = loc
+
+    def search(self, tokens):
+        results = None
+
+        for token in set([Character.asciify(t) for t in tokens]):
+            matches = self.search_index.lookup(token)
+            if results is None:
+                results = matches
+            else:
+                results = intersect_postings(results, matches)
+            if len(results) == 0:
+                break
+
+        return results if results is not None else []
 
     @staticmethod
     def tokenize_query(text):
@@ -218,6 +360,28 @@ class TitleHistoryBrowser(object):
                 else:
                     self.show_tags = (parts[2] == 'on')
 
+            elif command == 'snapshot' or command.startswith('snapshot '):
+                parts = command.split()
+                if (len(parts) < 2 or len(parts) > 3
+                    or not self.date_regex.match(parts[1])):
+                    print('Usage: "snapshot <(Y)YYY.MM.DD> [<rank>]"')
+                elif len(parts) == 3 and parts[2] not in self.rank_words:
+                    print('Error: "' + parts[2] + '" is not a title rank')
+                else:
+                    date = Date()
+                    date.set_date(list(map(int, parts[1].split('.'))))
+                    rank = None
+                    if len(parts) == 3:
+                        rank = self.rank_words[parts[2]]
+                    self.show_snapshot(date, rank)
+
+            elif command == 'title' or command.startswith('title '):
+                parts = command.split()
+                if len(parts) != 2:
+                    print('Usage: "title <title id>"')
+                else:
+                    self.show_succession(parts[1])
+
             elif (re.match(r'^\d+$', command) 
                   and int(command) in self.character_map):
                 self.show_title_history(self.character_map[int(command)])
@@ -233,9 +397,7 @@ class TitleHistoryBrowser(object):
                 self.current_query = command
                 self.current_loc = 0
                 tokens = self.tokenize_query(command)
-                results = [c for c in self.character_map 
-                           if self.character_map[c].matches_search(tokens)]
-                self.current_results = sorted(
-                    results, key=lambda x: self.character_map[x].birthday
-                )
+                self.current_ordinals = self.search(tokens)
+                self.current_results = [self.birth_order[i]
+                                        for i in self.current_ordinals]
                 self.show_search_results()
@@ -0,0 +1,100 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datatypes import Date, Range
+
+class TitleTenure(object):
+    """One uninterrupted reign of a single holder over a title."""
+    def __init__(self, holder, ownership):
+        self.holder = holder
+        self.held_range = Range(ownership.held_range.start,
+                                ownership.held_range.end)
+        self.gain_type = ownership.gain_type
+        self.from_whom = ownership.from_whom
+        self.lose_type = ownership.lose_type
+        self.to_whom = ownership.to_whom
+        self.current_owner = ownership.current_owner
+
+    def extend(self, ownership):
+        self.held_range.end = ownership.held_range.end
+        self.lose_type = ownership.lose_type
+        self.to_whom = ownership.to_whom
+        self.current_owner = ownership.current_owner
+
+class TitleIndex(object):
+    """Per-title ownership intervals, sorted by the date they were gained."""
+    def __init__(self, character_map, title_map):
+        self.title_map = title_map
+        self.tenures = defaultdict(list)
+        self.starts = {}
+        self.successions = {}
+        self.titles_by_rank = defaultdict(list)
+
+        for c in character_map:
+            titles = character_map[c].title_history.titles
+
+            for t in titles:
+                for ownership in titles[t]:
+                    r = ownership.held_range
+                    if ownership.exclude_from_history or r.is_null():
+                        continue
+
+                    self.tenures[t].append((self.date_key(r.start),
+                                            self.date_key(r.end), c,
+                                            ownership))
+
+        for t in self.tenures:
+            self.tenures[t].sort(key=lambda x: x[0])
+            self.starts[t] = [x[0] for x in self.tenures[t]]
+            self.titles_by_rank[title_map[t].rank].append(t)
+
+            # Successive history blocks with the same holder are one reign
+            succession = []
+            for start, end, holder, ownership in self.tenures[t]:
+                if len(succession) > 0 and succession[-1].holder == holder:
+                    succession[-1].extend(ownership)
+                else:
+                    succession.append(TitleTenure(holder, ownership))
+            self.successions[t] = succession
+
+        for rank in self.titles_by_rank:
+            self.titles_by_rank[rank].sort()
+
+    @staticmethod
+    def date_key(date):
+        if type(date) != Date:
+            return (0, 0, 0)
+        return (date.year, date.month, date.day)
+
+    def holder_at(self, title_id, date):
+        if title_id not in self.starts:
+            return None
+
+        key = self.date_key(date)
+        i = bisect_right(self.starts[title_id], key) - 1
+        if i < 0:
+            return None
+
+        start, end, holder, ownership = self.tenures[title_id][i]
+        if end < key:
+            return None
+
+        return holder, ownership
+
+    def holders_at(self, date, rank=None):
+        if rank is None:
+            ranks = sorted(self.titles_by_rank)
+        else:
+            ranks = [rank]
+
+        result = []
+
+        for r in ranks:
+            for t in self.titles_by_rank.get(r, []):
+                held = self.holder_at(t, date)
+                if held is not None:
+                    result.append((t, held[0], held[1]))
+
+        return result
+
+    def succession(self, title_id):
+        return self.successions.get(title_id, [])
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+
+"""Checks CK2 data for characters the parser does not expect.
+
+This follows the same states as GameData.parse_ck2_data, but instead of
+producing keys and values it reports where the data looks wrong, so that
+the parser itself does not have to check every character.
+"""
+
+import sys
+from string import whitespace
+
+special_chars = ['{', '}', '=', '"', '#']
+
+class Diagnostic(object):
+    """A problem found at a line and column (both counted from 1)."""
+    def __init__(self, line, column, message, state=''):
+        self.line = line
+        self.column = column
+        self.message = message
+        self.state = state
+
+    def __str__(self):
+        text = ('line ' + str(self.line) + ', column ' + str(self.column) +
+                ': ' + self.message)
+        if self.state != '':
+            text += ' (' + self.state + ')'
+        return text
+
+def validate_ck2_data(data, is_save=False):
+    diagnostics = []
+    depth = 0
+    list_items = 0
+    line = 1
+    column = 0
+
+    if is_save:
+        state = 'begin'
+    else:
+        state = 'expect_key'
+
+    saved_state = ''
+    temp_string = ''
+    end_line = 1
+    end_column = 0
+
+    for x in data:
+        column += 1
+        unexpected = False
+
+        if state == 'begin':
+            if temp_string == 'CK2txt':
+                state = 'expect_key'
+                temp_string = ''
+            else:
+                temp_string += x
+
+        elif state == 'expect_key':
+            if x == '}' and depth > 0:
+                depth -= 1
+            elif x == '{':
+                depth += 1
+            elif x == '#':
+                saved_state = 'expect_key'
+                state = 'comment'
+            elif x in special_chars:
+                unexpected = True
+            elif x not in whitespace:
+                state = 'key'
+
+        elif state == 'key':
+            if x == '=':
+                depth += 1
+                state = 'expect_value'
+            elif x == '}':
+                if depth > 0:
+                    depth -= 1
+                state = 'expect_key'
+            elif x in special_chars:
+                unexpected = True
+            elif x in whitespace:
+                list_items = 1
+                state = 'list'
+
+        elif state == 'expect_value':
+            if x == '"':
+                state = 'quoted_value'
+            elif x == '{':
+                state = 'expect_key'
+            elif x in special_chars:
+                unexpected = True
+            elif x not in whitespace:
+                state = 'value'
+
+        elif state == 'value':
+            if x in whitespace or x == '}':
+                if depth > 0:
+                    depth -= 1
+                if x == '}' and depth > 0:
+                    depth -= 1
+                state = 'expect_key'
+            elif x == '{':
+                if depth == 0:
+                    depth = 1
+                state = 'expect_key'
+            elif x == '#':
+                if depth > 0:
+                    depth -= 1
+                saved_state = 'expect_key'
+                state = 'comment'
+            elif x in special_chars:
+                unexpected = True
+
+        elif state == 'quoted_value':
+            if x == '"':
+                if depth > 0:
+                    depth -= 1
+                state = 'expect_key'
+
+        elif state == 'list':
+            if x == '}':
+                if depth > 0:
+                    depth -= 1
+                state = 'expect_key'
+            elif x == '=' and list_items == 1:
+                depth += 1
+                state = 'expect_value'
+            elif x == '#':
+                saved_state = 'list'
+                state = 'comment'
+            elif x == '"':
+                state = 'quoted_list_item'
+            elif x in special_chars:
+                unexpected = True
+            elif x not in whitespace:
+                state = 'list_item'
+
+        elif state == 'list_item':
+            if x == '}':
+                if depth > 0:
+                    depth -= 1
+                state = 'expect_key'
+            elif x in whitespace:
+                list_items += 1
+                state = 'list'
+            elif x == '#':
+                list_items += 1
+                saved_state = 'list'
+                state = 'comment'
+            elif x in special_chars:
+                unexpected = True
+
+        elif state == 'quoted_list_item':
+            if x == '"':
+                list_items += 1
+                state = 'list'
+
+        elif state == 'comment':
+            if x == '\n':
+                state = saved_state
+                saved_state = ''
+
+        if unexpected:
+            if state == 'key':
+                message = 'Unexpected character in key: ' + x
+            else:
+                message = 'Unexpected character ' + x
+            diagnostics.append(Diagnostic(line, column, message, state))
+
+        # Problems at the end are reported at the last character
+        end_line = line
+        end_column = column
+
+        if x == '\n':
+            line += 1
+            column = 0
+
+    if state in ['quoted_value', 'quoted_list_item']:
+        diagnostics.append(Diagnostic(end_line, end_column,
+                                      'Unterminated quoted string', state))
+    elif state == 'begin':
+        diagnostics.append(Diagnostic(end_line, end_column,
+                                      'Missing CK2txt header', state))
+    elif depth > 0 and state == 'expect_key':
+        diagnostics.append(Diagnostic(end_line, end_column,
+                                      'Data ends inside a block', state))
+
+    return diagnostics
+
+def main():
+    # Usage: validator.py FILE... (files ending in .ck2 are checked as saves)
+    problems = 0
+
+    for filename in sys.argv[1:]:
+        with open(filename, encoding='cp1252', errors='replace') as file:
+            data = file.read()
+
+        for diagnostic in validate_ck2_data(data, filename.endswith('.ck2')):
+            print(filename + ':', diagnostic)
+            problems += 1
+
+    sys.exit(1 if problems > 0 else 0)
+
+if __name__ == '__main__':
+    main()
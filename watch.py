@@ -0,0 +1,91 @@
+import os
+import os.path
+import sys
+import time
+import traceback
+
+import settings
+from batch import convert_save, output_path
+
+def save_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+def is_up_to_date(save, output):
+    if not os.path.exists(output):
+        return False
+    return os.path.getmtime(output) >= os.path.getmtime(save)
+
+def fingerprint_path(fingerprint_file, save):
+    # Every save keeps its own fingerprints, e.g. tree.autosave.fingerprints
+    # for --incremental tree.fingerprints, so that exports of different saves
+    # are never compared with each other
+    root, extension = os.path.splitext(fingerprint_file)
+    name = os.path.splitext(os.path.basename(save))[0]
+    return root + '.' + name + extension
+
+def watch_directory(game_data, directory, mode, output_dir=None,
+                    interval=5.0, settle_time=10.0, render_jobs=1,
+                    extension='.ged', fingerprint_file=None):
+    # Saves are only converted once their modification time and size have
+    # stayed the same for settle_time seconds, so that saves which are still
+    # being written are not read halfway through
+    converted = {}
+    pending = {}
+
+    for f in os.listdir(directory):
+        path = os.path.join(directory, f)
+        if (f.endswith('.ck2')
+            and is_up_to_date(path,
+                              output_path(path, output_dir, extension))):
+            converted[path] = save_signature(path)
+
+    print('### Watching', directory, 'for new saves. Press Ctrl+C to stop.'
+          ' ###')
+    sys.stdout.flush()
+
+    while True:
+        now = time.time()
+
+        for f in sorted(os.listdir(directory)):
+            path = os.path.join(directory, f)
+            if not f.endswith('.ck2'):
+                continue
+
+            signature = save_signature(path)
+            if signature is None or converted.get(path) == signature:
+                pending.pop(path, None)
+                continue
+
+            if path not in pending or pending[path][0] != signature:
+                pending[path] = (signature, now)
+                continue
+
+            if now - pending[path][1] < settle_time:
+                continue
+
+            del pending[path]
+            converted[path] = signature
+            output = output_path(path, output_dir, extension)
+            if fingerprint_file is not None:
+                fingerprints = fingerprint_path(fingerprint_file, path)
+            else:
+                fingerprints = None
+
+            try:
+                convert_save(game_data, path, output, mode, render_jobs,
+                             fingerprints)
+            except Exception as e:
+                # One bad save must not stop the watcher, so errors are only
+                # reported, with the traceback in debug mode
+                if settings.debug:
+                    traceback.print_exc()
+                print('### Error converting', path + ':', repr(e), '###')
+            else:
+                print('### Converted', path, 'to', output, '###')
+            sys.stdout.flush()
+
+        time.sleep(interval)